@@ -3,77 +3,119 @@ app/api/auth.py
 Реализует функции для регистрации и аутентификации пользователей с использованием JWT.
 """
 import logging
-import uuid
+import secrets
+import time
 
 from fastapi import APIRouter, HTTPException, Depends, Response, Cookie, status, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
-import jwt
-from sqlalchemy import delete, select
+from sqlalchemy import TIMESTAMP, bindparam, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime, timedelta
-from passlib.context import CryptContext
+from datetime import timedelta
 
-from app.api.dependencies import get_current_user
+from app.api.dependencies import get_cached_user_json, get_current_user, invalidate_user_tokens, oauth2_scheme
 from app.core.rate_limiter import limiter
 from app.models.models import User as UserModel, RefreshToken, User
 from app.core.database import get_db
-from app.services.user_service import get_user
-from app.schemas.user_schemas import UserCreate, UserResponse, UserUpdate
+from app.services.user_service import get_user_credentials
+from app.schemas.user_schemas import UserCreate, UserResponse, UserUpdate, user_response_payload
 from app.core.config import settings
+from app.core.tokens import encode_token
+from app.core.security import hash_password, verify_and_update_password, verify_dummy_password
+from app.utils.http_cache import etag_json_response
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Извлечение конфигурационных данных
-SECRET_KEY = settings.secret_key
-ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 REFRESH_TOKEN_EXPIRE_MINUTES = settings.refresh_token_expire_minutes
+ACCESS_TOKEN_EXPIRE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+REFRESH_TOKEN_EXPIRE_SECONDS = REFRESH_TOKEN_EXPIRE_MINUTES * 60
+
+# Запросы, выполняемые на каждом входе/обновлении токена, собираются один раз при импорте.
+# expires_at хранится в UTC без часового пояса и вычисляется по часам базы данных
+_DB_UTC_NOW = func.timezone("utc", func.now(), type_=TIMESTAMP)
+_SELECT_REFRESH_TOKEN_WITH_USER = (
+    select(RefreshToken, User).join(User, User.id == RefreshToken.user_id)
+    .where(RefreshToken.token == bindparam("token"), RefreshToken.expires_at > _DB_UTC_NOW)
+)
+# Один запрос вместо DELETE + INSERT: существующий токен пользователя перезаписывается
+_upsert_refresh_token = insert(RefreshToken).values(
+    user_id=bindparam("user_id"),
+    token=bindparam("token"),
+    expires_at=_DB_UTC_NOW + timedelta(seconds=REFRESH_TOKEN_EXPIRE_SECONDS),
+)
+_UPSERT_REFRESH_TOKEN = _upsert_refresh_token.on_conflict_do_update(
+    index_elements=[RefreshToken.user_id],
+    set_={"token": _upsert_refresh_token.excluded.token, "expires_at": _upsert_refresh_token.excluded.expires_at},
+)
+# Регистрация одним INSERT ... ON CONFLICT DO NOTHING RETURNING по уникальным username и email
+_INSERT_USER = (
+    insert(User)
+    .values(
+        username=bindparam("username"),
+        hashed_password=bindparam("hashed_password"),
+        email=bindparam("email"),
+        is_active=True,
+        is_superuser=False,
+        is_verified=False,
+    )
+    .on_conflict_do_nothing()
+    .returning(User)
+)
+# Перехэширование устаревшего пароля при входе без загрузки ORM-объекта пользователя
+_UPDATE_PASSWORD_HASH = (
+    update(User).where(User.id == bindparam("user_id")).values(hashed_password=bindparam("hashed_password"))
+)
+
+
+def _cookie_attributes(max_age: int) -> str:
+    """Атрибуты Set-Cookie, общие для cookie с токенами."""
+    attributes = f"; HttpOnly; Max-Age={max_age}; Path=/; SameSite=lax"
+    return attributes if settings.debug else attributes + "; Secure"
+
+
+# Атрибуты cookie не меняются между запросами, поэтому заголовки собираются из готовых строк
+_ACCESS_COOKIE_ATTRIBUTES = _cookie_attributes(ACCESS_TOKEN_EXPIRE_SECONDS)
+_REFRESH_COOKIE_ATTRIBUTES = _cookie_attributes(REFRESH_TOKEN_EXPIRE_SECONDS)
+
+
+def _set_auth_cookies(response: Response, access_token: str, refresh_token: str):
+    """Устанавливает cookie с access и refresh токенами."""
+    response.headers.append("set-cookie", f"access_token={access_token}{_ACCESS_COOKIE_ATTRIBUTES}")
+    response.headers.append("set-cookie", f"refresh_token={refresh_token}{_REFRESH_COOKIE_ATTRIBUTES}")
 
 
 def create_access_token(to_encode: dict):
     """Функция для создания JWT токена"""
 
-    expires_at = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expires_at})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    to_encode["exp"] = int(time.time()) + ACCESS_TOKEN_EXPIRE_SECONDS
+    return encode_token(to_encode)
 
 
-async def create_refresh_token(user: UserModel, db: AsyncSession):
+async def create_refresh_token(user_id: int, db: AsyncSession):
     """
-    Создает и сохраняет refresh token в базе данных, удаляя предыдущие от того же пользователя.
+    Создает и сохраняет refresh token в базе данных, заменяя предыдущий токен того же пользователя.
     После авторизации с одного устройства, сессия с другого устройства пропадает.
     """
-    await db.execute(delete(RefreshToken).where(RefreshToken.user_id == user.id))
-
-    expires_at = datetime.utcnow() + timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
-    token = str(uuid.uuid4())
-    refresh_token = RefreshToken(user_id=user.id, token=token, expires_at=expires_at)
-    db.add(refresh_token)
+    token = secrets.token_urlsafe(32)
+    await db.execute(_UPSERT_REFRESH_TOKEN, {"user_id": user_id, "token": token})
     await db.commit()
 
-    return str(token)
+    return token
 
 
-async def verify_refresh_token(db: AsyncSession, refresh_token: str) -> RefreshToken | None:
+async def verify_refresh_token(db: AsyncSession, refresh_token: str) -> tuple[RefreshToken, User] | None:
     """
     Верифицирует refresh token: проверяет, существует ли он, не истек ли срок действия.
+    Возвращает запись токена вместе с его пользователем, загруженные одним запросом.
+    Просроченные токены отсекаются на стороне базы данных и перезаписываются при следующем входе.
     """
-    query = select(RefreshToken).where(RefreshToken.token == refresh_token)
-    result = await db.execute(query)
-    refresh_token_record = result.scalars().first()
-
-    if not refresh_token_record:
-        return None
-
-    if refresh_token_record.expires_at < datetime.utcnow():
-        await db.delete(refresh_token_record)
-        await db.commit()
-        return None
-
-    return refresh_token_record
+    result = await db.execute(_SELECT_REFRESH_TOKEN_WITH_USER, {"token": refresh_token})
+    return result.first()
 
 
 @router.post("/registration/", status_code=status.HTTP_201_CREATED,
@@ -82,31 +124,27 @@ async def verify_refresh_token(db: AsyncSession, refresh_token: str) -> RefreshT
 async def register(request: Request, user: UserCreate, db: AsyncSession = Depends(get_db)):
     """Регистрация пользователя"""
     try:
-        async with db.begin():
-            existing_user = await get_user(db, user.username)
-            if existing_user:
-                logger.warning(f"Ошибка при регистрации пользователя: Пользователь с таким никнеймом уже "
-                               f"зарегистирирован")
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                    detail="Пользователь с таким никнеймом уже зарегистирирован")
-
-            # Хэшируем пароль
-            hashed_password = pwd_context.hash(user.password)
-            new_user = UserModel(
-                username=user.username,
-                hashed_password=hashed_password,
-                registered_at=datetime.utcnow(),
-                email=user.email,
-                is_active=True,
-                is_superuser=False,
-                is_verified=False,
-            )
-            db.add(new_user)
-            await db.commit()
-            await db.refresh(new_user)
-            return UserResponse.model_validate(new_user)
-    except Exception as e:
-        logger.exception(f"Ошибка при регистрации пользователя: {e}")
+        # Хэшируем пароль
+        hashed_password = await hash_password(user.password)
+        # Уникальность имени и почты проверяет база данных: при конфликте строка не вставляется
+        # и RETURNING ничего не возвращает - без отдельного SELECT и без прерванной транзакции
+        result = await db.execute(_INSERT_USER, {
+            "username": user.username,
+            "hashed_password": hashed_password,
+            "email": user.email,
+        })
+        new_user = result.scalar_one_or_none()
+        if new_user is None:
+            logger.warning("Ошибка при регистрации пользователя: Пользователь с таким никнеймом или почтой уже "
+                           "зарегистирирован")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="Пользователь с таким никнеймом или почтой уже зарегистирирован")
+        await db.commit()
+        return ORJSONResponse(user_response_payload(new_user), status_code=status.HTTP_201_CREATED)
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Ошибка при регистрации пользователя")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Ошибка регистрации пользователя")
 
@@ -117,42 +155,44 @@ async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends
                 response: Response = Response()):
     """Аутентификация и получение JWT токена"""
     try:
-        user = await get_user(db, form_data.username)
-        if not user or not pwd_context.verify(form_data.password, user.hashed_password):
-            logger.warning(f"Ошибка при аутентификации пользователя: Неверное имя пользователя или пароль.")
+        # Для входа нужны только id, имя и хэш пароля - ORM-объект не создается
+        user = await get_user_credentials(db, form_data.username)
+        if user is not None:
+            verified, new_hash = await verify_and_update_password(form_data.password, user.hashed_password,
+                                                                 user.username)
+        else:
+            # Проверка тратит столько же времени, сколько для существующего пользователя
+            await verify_dummy_password(form_data.password)
+            verified, new_hash = False, None
+        if not verified:
+            logger.warning("Ошибка при аутентификации пользователя: Неверное имя пользователя или пароль.")
             raise HTTPException(status_code=401, detail="Неверное имя пользователя или пароль.")
+        if new_hash:
+            # Хэш устарел (другая схема или параметры) - сохранится вместе с refresh token
+            await db.execute(_UPDATE_PASSWORD_HASH, {"user_id": user.id, "hashed_password": new_hash})
 
         access_token = create_access_token({"sub": user.username})
-        response.set_cookie(
-            key="access_token",
-            value=access_token,
-            httponly=True,
-            max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-            samesite="lax",
-            secure=not settings.debug
-        )
-
-        refresh_token = await create_refresh_token(user, db)
-        response.set_cookie(
-            key="refresh_token",
-            value=refresh_token,
-            httponly=True,
-            max_age=REFRESH_TOKEN_EXPIRE_MINUTES * 60,
-            samesite="lax",
-            secure=not settings.debug
-        )
+        refresh_token = await create_refresh_token(user.id, db)
+        # Новый вход сбрасывает кэшированные данные пользователя: следующий запрос с токеном перечитает их из базы
+        await invalidate_user_tokens(user.id)
+        _set_auth_cookies(response, access_token, refresh_token)
         return {"access_token": access_token, "token_type": "bearer"}
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.exception(f"Ошибка при входе пользователя: {e}")
+        logger.exception("Ошибка при входе пользователя")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail=f"Ошибка авторизации. Подробнее: {e}")
 
 
 @router.get("/me", summary="Получение информации текущего пользователя")
 @limiter.limit("5/minute")
-async def read_current_user(request: Request, current_user: UserModel = Depends(get_current_user)):
+async def read_current_user(request: Request, token: str = Depends(oauth2_scheme),
+                            current_user: UserModel = Depends(get_current_user)):
     """Возвращает информацию о текущем пользователе."""
-    return UserResponse.model_validate(current_user)
+    # Профиль сериализуется один раз на токен и отдается готовыми байтами
+    body = await get_cached_user_json(token, current_user)
+    return etag_json_response(request, body)
 
 
 @router.put("/me", summary="Обновление информации пользователя")
@@ -161,22 +201,27 @@ async def update_user_info(request: Request, user_update: UserUpdate,
                            current_user: UserModel = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Обновляет информацию текущего пользователя"""
     try:
-        async with db.begin():
-            existing_user = await get_user(db, user_update.username)
-            if existing_user and existing_user.id != current_user.id:
-                logger.warning(f"Ошибка при обновлении информации пользователя: Пользователя не существует")
-                raise HTTPException(status_code=400, detail="Имя пользователя уже зарегистрировано")
-
-            current_user.username = user_update.username
-            current_user.hashed_password = pwd_context.hash(user_update.password)
-            current_user.email = user_update.email
-            current_user.additional_info = user_update.additional_info
-
+        # Занятость имени и почты проверяет уникальный индекс при commit, отдельный SELECT с ролью не нужен
+        current_user.username = user_update.username
+        current_user.hashed_password = await hash_password(user_update.password)
+        current_user.email = user_update.email
+        current_user.additional_info = user_update.additional_info
+
+        user_id = current_user.id  # После rollback атрибуты пользователя истекают
+        try:
             await db.commit()
-            await db.refresh(current_user)
-            return UserResponse.model_validate(current_user)
-    except Exception as e:
-        logger.exception(f"Ошибка при обновлении информации пользователя: {e}")
+        except IntegrityError:
+            await db.rollback()
+            # Изменения отменены, но могли попасть в кэш токенов - записи пользователя сбрасываются
+            await invalidate_user_tokens(user_id)
+            logger.warning("Ошибка при обновлении информации пользователя: Имя пользователя или почта уже заняты")
+            raise HTTPException(status_code=400, detail="Имя пользователя уже зарегистрировано")
+        await invalidate_user_tokens(user_id)
+        return ORJSONResponse(user_response_payload(current_user))
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Ошибка при обновлении информации пользователя")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Ошибка обновления информации пользователя")
 
@@ -195,42 +240,24 @@ async def refresh_token_endpoint(request: Request, refresh_token: str = Cookie(N
     """Обновление access token с использованием refresh token"""
     try:
         if not refresh_token:
-            logger.warning(f"Ошибка при обновлении токена: нет токена")
+            logger.warning("Ошибка при обновлении токена: нет токена")
             raise HTTPException(status_code=400, detail="Refresh token is missing")
 
-        refresh_token_record = await verify_refresh_token(db, refresh_token)
-        if not refresh_token_record:
-            logger.warning(f"Ошибка при обновлении токена: Токен не действителен")
+        verified = await verify_refresh_token(db, refresh_token)
+        if not verified:
+            logger.warning("Ошибка при обновлении токена: Токен не действителен")
             raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
 
-        user_id = refresh_token_record.user_id  # Получаем пользователя из refresh token
-        user = await db.scalar(select(User).where(User.id == user_id))
-        if not user:
-            logger.warning(f"Ошибка при обновлении токена: Пользователя не существует")
-            raise HTTPException(status_code=404, detail="User not found")
+        _, user = verified  # Пользователь загружен вместе с refresh token
         access_token = create_access_token({"sub": user.username, "user_id": user.id})
 
-        new_refresh_token = await create_refresh_token(user, db)
-
-        response.set_cookie(
-            key="access_token",
-            value=access_token,
-            httponly=True,
-            max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-            samesite="lax",
-            secure=not settings.debug,
-        )
-
-        response.set_cookie(
-            key="refresh_token",
-            value=new_refresh_token,
-            httponly=True,
-            max_age=REFRESH_TOKEN_EXPIRE_MINUTES * 60,
-            samesite="lax",
-            secure=not settings.debug,
-        )
+        new_refresh_token = await create_refresh_token(user.id, db)
+
+        _set_auth_cookies(response, access_token, new_refresh_token)
 
         return {"access_token": access_token, "token_type": "bearer"}
-    except Exception as e:
-        logger.exception(f"Ошибка при обновлении токена: {e}")
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Ошибка при обновлении токена")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Ошибка обновления токена")
@@ -2,27 +2,112 @@
 app/api/dependencies.py
 Содержит зависимости для FastAPI, включая получение текущего пользователя по токену.
 """
+import asyncio
+import time
+from collections import OrderedDict
+
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 import jwt
 import logging
+import orjson
 
+from sqlalchemy import inspect
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
-from app.core.config import settings
+from app.core.tokens import decode_token
 from app.core.database import get_db
+from app.schemas.user_schemas import user_response_payload
 from app.services.user_service import get_user
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 logger = logging.getLogger(__name__)
 
+# Кэш проверенных токенов: token -> [exp (unix time), оставшиеся обращения, пользователь, JSON профиля или None]
+TOKEN_CACHE_MAX_SIZE = 10_000
+TOKEN_CACHE_CREDITS = 100  # После стольких обращений подпись токена проверяется заново
+TOKEN_CACHE_TTL_SEC = 60  # Не дольше этого срока пользователь берется из кэша, даже если токен еще действует
+TOKEN_CACHE: OrderedDict = OrderedDict()
+_token_cache_lock = asyncio.Lock()
+
+
+def _detached_snapshot(user):
+    """
+    Возвращает копию загруженных колонок пользователя, не привязанную к сессии.
+    В кэше хранится копия, поэтому изменения и rollback в обработчике запроса не затрагивают кэш.
+    """
+    state = inspect(user)
+    snapshot = state.mapper.class_(**{attr.key: state.dict[attr.key] for attr in state.mapper.column_attrs
+                                      if attr.key in state.dict})
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+async def _get_cached_user(token: str):
+    """
+    Возвращает пользователя из кэша токенов, если запись не истекла и у нее остались обращения.
+    """
+    async with _token_cache_lock:
+        entry = TOKEN_CACHE.get(token)
+        if entry is None:
+            return None
+        if entry[0] <= time.time() or entry[1] <= 0:
+            del TOKEN_CACHE[token]
+            return None
+        entry[1] -= 1
+        TOKEN_CACHE.move_to_end(token)
+        return entry[2]
+
+
+async def _store_cached_user(token: str, exp: float, user):
+    """
+    Сохраняет пользователя в кэше токенов, вытесняя самые давние записи при переполнении.
+    Запись живет до истечения токена, но не дольше TOKEN_CACHE_TTL_SEC.
+    """
+    expires_at = min(exp, time.time() + TOKEN_CACHE_TTL_SEC)
+    async with _token_cache_lock:
+        TOKEN_CACHE[token] = [expires_at, TOKEN_CACHE_CREDITS, user, None]
+        TOKEN_CACHE.move_to_end(token)
+        while len(TOKEN_CACHE) > TOKEN_CACHE_MAX_SIZE:
+            TOKEN_CACHE.popitem(last=False)
+
+
+async def get_cached_user_json(token: str, user) -> bytes:
+    """
+    Возвращает сериализованный профиль пользователя, кэшируя его вместе с токеном.
+    """
+    async with _token_cache_lock:
+        entry = TOKEN_CACHE.get(token)
+        if entry is not None and entry[3] is not None:
+            return entry[3]
+        body = orjson.dumps(user_response_payload(user))
+        if entry is not None:
+            entry[3] = body
+        return body
+
+
+async def invalidate_user_tokens(user_id: int):
+    """
+    Удаляет из кэша все токены пользователя (смена пароля, имени, роли и т.п.).
+    """
+    async with _token_cache_lock:
+        stale = [token for token, entry in TOKEN_CACHE.items() if entry[2].id == user_id]
+        for token in stale:
+            del TOKEN_CACHE[token]
+
 
 async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     """
     Получает текущего пользователя по токену.
     """
     try:
-        credentials = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        cached_user = await _get_cached_user(token)
+        if cached_user is not None:
+            # Привязываем копию пользователя к сессии запроса без обращения к базе данных
+            return await db.merge(cached_user, load=False)
+
+        credentials = decode_token(token)
         username = credentials.get("sub")
         if username is None:
             logger.warning("Не удалось извлечь имя пользователя из токена")
@@ -30,21 +115,25 @@ async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)
 
         user = await get_user(db, username)
         if user is None:
-            logger.warning(f"Пользователь не найден: {username}")
+            logger.warning("Пользователь не найден: %s", username)
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                 detail="Недействительные учетные данные аутентификации")
-        logger.debug(f"Пользователь успешно получен из токена: {username}")
+        if "exp" in credentials:
+            await _store_cached_user(token, credentials["exp"], _detached_snapshot(user))
+        logger.debug("Пользователь успешно получен из токена: %s", username)
         return user
 
+    except HTTPException:
+        raise
     except jwt.ExpiredSignatureError as e:
-        logger.warning(f"Попытка доступа с просроченным токеном: {e}")
+        logger.warning("Попытка доступа с просроченным токеном: %s", e)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Срок действия токена истек")
     except jwt.InvalidTokenError as e:
-        logger.warning(f"Попытка доступа с недействительным токеном: {e}")
+        logger.warning("Попытка доступа с недействительным токеном: %s", e)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Недействительный токен")
-    except Exception as e:
-        logger.exception(f"Ошибка при получении текущего пользователя: {e}")
+    except Exception:
+        logger.exception("Ошибка при получении текущего пользователя")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Ошибка аутентификации")
@@ -2,42 +2,97 @@
 app/api/roles.py
 
 """
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import ARRAY, String, bindparam, delete, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional
 
 import logging
+import orjson
 
 from app.core.database import get_db
-from app.schemas.role_schemas import RoleResponse, RoleCreate, RoleUpdate
+from app.schemas.role_schemas import RoleResponse, RoleCreate, RoleUpdate, RolePage
 from app.models.models import Role as RoleModel, User as UserModel
+from app.api.dependencies import invalidate_user_tokens
+from app.services.role_service import invalidate_role_permissions
 from app.utils.permissions import permission_dependency
 from app.core.rate_limiter import limiter
+from app.utils.http_cache import etag_json_response
 
 
 router = APIRouter(prefix="/roles")
 
 logger = logging.getLogger(__name__)
 
+ROLES_PAGE_MAX_LIMIT = 1000
+# Пагинация по ключу: WHERE id > cursor использует первичный ключ, в отличие от OFFSET
+_SELECT_ROLES_PAGE = (
+    select(RoleModel)
+    .where(RoleModel.id > bindparam("cursor"))
+    .order_by(RoleModel.id)
+    .limit(bindparam("limit"))
+)
+# Изменение разрешений выполняется на стороне PostgreSQL операциями над массивом
+_ADD_PERMISSIONS = select(RoleModel).from_statement(
+    text("""
+        UPDATE role
+        SET permissions = coalesce(permissions, '{}') || ARRAY(
+            SELECT DISTINCT p FROM unnest(CAST(:permissions AS varchar[])) AS p
+            WHERE p <> ALL(coalesce(permissions, '{}'))
+        )
+        WHERE id = :role_id
+        RETURNING id, name, permissions
+    """).bindparams(bindparam("permissions", type_=ARRAY(String)))
+).execution_options(populate_existing=True)
+_REMOVE_PERMISSIONS = select(RoleModel).from_statement(
+    text("""
+        UPDATE role
+        SET permissions = ARRAY(
+            SELECT p FROM unnest(permissions) WITH ORDINALITY AS t(p, i)
+            WHERE p <> ALL(CAST(:permissions AS varchar[]))
+            ORDER BY i
+        )
+        WHERE id = :role_id
+        RETURNING id, name, permissions
+    """).bindparams(bindparam("permissions", type_=ARRAY(String)))
+).execution_options(populate_existing=True)
+# Проверка существования совмещена с изменением: RETURNING пуст, если строки нет
+_ASSIGN_ROLE = (
+    update(UserModel)
+    .where(UserModel.id == bindparam("user_id"))
+    .values(role_id=bindparam("role_id"))
+    .returning(UserModel.username)
+)
+_INSERT_ROLE = (
+    insert(RoleModel)
+    .values(name=bindparam("name"), permissions=bindparam("permissions", type_=ARRAY(String)))
+    .returning(RoleModel)
+)
+_DELETE_ROLE = delete(RoleModel).where(RoleModel.id == bindparam("role_id")).returning(RoleModel)
+
+
+def _role_payload(role: RoleModel) -> dict:
+    """Поля роли для ответа. Строка получена из нашей базы данных, повторная валидация Pydantic не нужна."""
+    return {"id": role.id, "name": role.name, "permissions": role.permissions or []}
+
+
+def _role_response(role: RoleModel, status_code: int = status.HTTP_200_OK) -> ORJSONResponse:
+    """Ответ с ролью в обход response_model; схема RoleResponse остается в документации OpenAPI."""
+    return ORJSONResponse(_role_payload(role), status_code=status_code)
+
 
 @router.post("/", response_model=RoleResponse, status_code=status.HTTP_201_CREATED)
 @limiter.limit("5/minute")
 async def create_role(request: Request, role: RoleCreate, db: AsyncSession = Depends(get_db),
                       has_permission: bool = Depends(permission_dependency('manage_users'))):
     """Создает новую роль с проверкой на разрешение"""
-    try:
-        db_role = RoleModel(**role.model_dump())
-        db.add(db_role)
-        await db.commit()
-        await db.refresh(db_role)
-        logger.info(f"Создана новая роль: {db_role.name}")
-        return RoleResponse.model_validate(db_role)
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
-        logger.exception(f"Ошибка при создании роли: {e}")
-        raise HTTPException(status_code=500, detail=f"Произошла ошибка {e}")
+    # INSERT ... RETURNING возвращает созданную строку, refresh после commit не нужен
+    db_role = (await db.execute(_INSERT_ROLE, role.model_dump())).scalar_one()
+    await db.commit()
+    logger.info("Создана новая роль: %s", db_role.name)
+    return _role_response(db_role, status.HTTP_201_CREATED)
 
 
 @router.get("/{role_id}", response_model=RoleResponse)
@@ -45,19 +100,12 @@ async def create_role(request: Request, role: RoleCreate, db: AsyncSession = Dep
 async def read_role(request: Request, role_id: int, db: AsyncSession = Depends(get_db),
                     has_permission: bool = Depends(permission_dependency('manage_users'))):
     """Возвращает роль по ID с проверкой на разрешение"""
-    try:
-        result = await db.execute(select(RoleModel).where(RoleModel.id == role_id))
-        role = result.scalars().first()
-        if role is None:
-            logger.warning(f"Ошибка при чтении роли: Роль с ID {role_id} не найдена")
-            raise HTTPException(status_code=404, detail="Роль не найдена")
-        logger.debug(f"Роль успешно прочитана: {role.name}, ID: {role_id}")
-        return RoleResponse.model_validate(role)
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
-        logger.exception(f"Ошибка при чтении роли: {e}")
-        raise HTTPException(status_code=500, detail=f"Произошла ошибка {e}")
+    role = await db.get(RoleModel, role_id)
+    if role is None:
+        logger.warning("Ошибка при чтении роли: Роль с ID %s не найдена", role_id)
+        raise HTTPException(status_code=404, detail="Роль не найдена")
+    logger.debug("Роль успешно прочитана: %s, ID: %s", role.name, role_id)
+    return etag_json_response(request, orjson.dumps(_role_payload(role)))
 
 
 @router.put("/{role_id}", response_model=RoleResponse)
@@ -65,26 +113,21 @@ async def read_role(request: Request, role_id: int, db: AsyncSession = Depends(g
 async def update_role(request: Request, role_id: int, role_update: RoleUpdate, db: AsyncSession = Depends(get_db),
                       has_permission: bool = Depends(permission_dependency('manage_users'))):
     """Обновляет роль по ID"""
-    try:
-        result = await db.execute(select(RoleModel).where(RoleModel.id == role_id))
-        role = result.scalars().first()
-        if role is None:
-            logger.warning(f"Ошибка при обновлении роли: Роль с ID {role_id} не найдена")
-            raise HTTPException(status_code=404, detail="Роль не найдена")
-
-        if role_update.name is not None:
-            role.name = role_update.name
-        if role_update.permissions is not None:
-            role.permissions = role_update.permissions
-
-        db.add(role)
-        logger.info(f"Роль успешно обновлена: {role.name}, ID: {role_id}")
-        return RoleResponse.model_validate(role)
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
-        logger.exception(f"Ошибка при обновлении роли: {e}")
-        raise HTTPException(status_code=500, detail=f"Произошла ошибка {e}")
+    values = role_update.model_dump(exclude_none=True)
+    if values:
+        # Один UPDATE ... RETURNING вместо чтения строки и последующего UPDATE
+        role = (await db.execute(update(RoleModel).where(RoleModel.id == role_id).values(**values)
+                                 .returning(RoleModel))).scalar()
+    else:
+        role = await db.get(RoleModel, role_id)
+    if role is None:
+        logger.warning("Ошибка при обновлении роли: Роль с ID %s не найдена", role_id)
+        raise HTTPException(status_code=404, detail="Роль не найдена")
+
+    await db.commit()
+    await invalidate_role_permissions(role_id)
+    logger.info("Роль успешно обновлена: %s, ID: %s", role.name, role_id)
+    return _role_response(role)
 
 
 @router.delete("/{role_id}", response_model=RoleResponse)
@@ -92,21 +135,16 @@ async def update_role(request: Request, role_id: int, role_update: RoleUpdate, d
 async def delete_role(request: Request, role_id: int, db: AsyncSession = Depends(get_db),
                       has_permission: bool = Depends(permission_dependency('manage_users'))):
     """Удаляет роль по ID."""
-    try:
-        result = await db.execute(select(RoleModel).where(RoleModel.id == role_id))
-        db_role = result.scalars().first()
-
-        if db_role is None:
-            logger.warning(f"Ошибка при удалении роли: Роль с ID {role_id} не найдена")
-            raise HTTPException(status_code=404, detail="Роль не найдена")
-        await db.delete(db_role)
-        logger.info(f"Роль успешно удалена: {db_role.name}, ID: {role_id}")
-        return RoleResponse.model_validate(db_role)
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
-        logger.exception(f"Ошибка при удалении роли: {e}")
-        raise HTTPException(status_code=500, detail=f"Произошла ошибка {e}")
+    # Один DELETE ... RETURNING вместо SELECT + DELETE
+    db_role = (await db.execute(_DELETE_ROLE, {"role_id": role_id})).scalar()
+
+    if db_role is None:
+        logger.warning("Ошибка при удалении роли: Роль с ID %s не найдена", role_id)
+        raise HTTPException(status_code=404, detail="Роль не найдена")
+    await db.commit()
+    await invalidate_role_permissions(role_id)
+    logger.info("Роль успешно удалена: %s, ID: %s", db_role.name, role_id)
+    return _role_response(db_role)
 
 
 @router.post("/{role_id}/permissions", response_model=RoleResponse)
@@ -114,30 +152,18 @@ async def add_permissions_to_role(request: Request, role_id: int, permissions: L
                                   db: AsyncSession = Depends(get_db),
                                   has_permission: bool = Depends(permission_dependency('manage_users'))):
     """Добавляет разрешения к роли."""
-    try:
-        role = await db.scalar(select(RoleModel).where(RoleModel.id == role_id))
+    # Одним атомарным UPDATE: без чтения строки и без потерянных обновлений при конкурентных запросах
+    role = (await db.execute(_ADD_PERMISSIONS, {"role_id": role_id, "permissions": permissions})).scalar()
 
-        if not role:
-            logger.warning(f"Роль с ID {role_id} не найдена")
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Роль не найдена")
+    if not role:
+        logger.warning("Роль с ID %s не найдена", role_id)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Роль не найдена")
 
-        if role.permissions is None:
-            role.permissions = []
-        for permission in permissions:
-            if permission not in role.permissions:
-                role.permissions.append(permission)
+    await db.commit()
+    await invalidate_role_permissions(role_id)
 
-        db.add(role)
-
-        logger.info(f"К роли {role.name} добавлены разрешения: {permissions}")
-        return RoleResponse.model_validate(role)
-
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
-        logger.exception(f"Ошибка при добавлении разрешений к роли: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail="Произошла ошибка при добавлении разрешений")
+    logger.info("К роли %s добавлены разрешения: %s", role.name, permissions)
+    return _role_response(role)
 
 
 @router.delete("/{role_id}/permissions", response_model=RoleResponse)
@@ -145,70 +171,49 @@ async def remove_permissions_from_role(request: Request, role_id: int, permissio
                                        db: AsyncSession = Depends(get_db),
                                        has_permission: bool = Depends(permission_dependency('manage_users'))):
     """Удаляет разрешения у роли."""
-    try:
-        role = await db.scalar(select(RoleModel).where(RoleModel.id == role_id))
-        if not role:
-            logger.warning(f"Роль с ID {role_id} не найдена")
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Роль не найдена")
-
-        if role.permissions is not None:
-            role.permissions = [p for p in role.permissions if p not in permissions]
+    role = (await db.execute(_REMOVE_PERMISSIONS, {"role_id": role_id, "permissions": permissions})).scalar()
+    if not role:
+        logger.warning("Роль с ID %s не найдена", role_id)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Роль не найдена")
 
-        db.add(role)
+    await db.commit()
+    await invalidate_role_permissions(role_id)
 
-        logger.info(f"У роли {role.name} удалены разрешения: {permissions}")
-        return RoleResponse.model_validate(role)
-
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
-        logger.exception(f"Ошибка при удалении разрешений у роли: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail="Произошла ошибка при удалении разрешений")
+    logger.info("У роли %s удалены разрешения: %s", role.name, permissions)
+    return _role_response(role)
 
 
 @router.put("/user/{user_id}/role/{role_id}", summary="Присвоение роли пользователю")
 async def assign_role_to_user(request: Request, user_id: int, role_id: int, db: AsyncSession = Depends(get_db),
                               has_permission: bool = Depends(permission_dependency('manage_users'))):
     """Присваивает указанную роль пользователю."""
+    # Один UPDATE ... RETURNING: несуществующую роль отклоняет внешний ключ
     try:
-        user = await db.scalar(select(UserModel).where(UserModel.id == user_id))
-        if not user:
-            logger.warning(f"Пользователь с ID {user_id} не найден.")
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
-
-        role = await db.scalar(select(RoleModel).where(RoleModel.id == role_id))
-        if not role:
-            logger.warning(f"Роль с ID {role_id} не найдена.")
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Роль не найдена")
+        username = (await db.execute(_ASSIGN_ROLE, {"user_id": user_id, "role_id": role_id})).scalar()
+    except IntegrityError:
+        await db.rollback()
+        logger.warning("Роль с ID %s не найдена.", role_id)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Роль не найдена")
 
-        user.role_id = role_id
-        db.add(user)
+    if username is None:
+        logger.warning("Пользователь с ID %s не найден.", user_id)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
 
-        logger.info(f"Пользователю {user.username} присвоена роль {role.name}.")
-        return {"message": f"Роль успешно присвоена пользователю {user.username}"}
+    await db.commit()
+    await invalidate_user_tokens(user_id)
 
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
-        logger.exception(f"Ошибка при присвоении роли пользователю: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail="Произошла ошибка при присвоении роли")
+    logger.info("Пользователю %s присвоена роль с ID %s.", username, role_id)
+    return {"message": f"Роль успешно присвоена пользователю {username}"}
 
 
-@router.get("/", response_model=List[RoleResponse])
+@router.get("/", response_model=RolePage)
 @limiter.limit("20/minute")
-async def get_all_roles(request: Request, db: AsyncSession = Depends(get_db),
+async def get_all_roles(request: Request, limit: int = Query(100, ge=1, le=ROLES_PAGE_MAX_LIMIT),
+                        cursor: Optional[int] = None, db: AsyncSession = Depends(get_db),
                         has_permission: bool = Depends(permission_dependency('manage_users'))):
-    """Возвращает список всех ролей с проверкой на разрешение."""
-    try:
-        result = await db.execute(select(RoleModel))
-        roles = result.scalars().all()
-        logger.debug("Список всех ролей успешно получен.")
-        return [RoleResponse.model_validate(role) for role in roles]
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
-        logger.exception(f"Ошибка при получении списка ролей: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail="Произошла ошибка при получении списка ролей")
+    """Возвращает страницу списка ролей с проверкой на разрешение."""
+    result = await db.execute(_SELECT_ROLES_PAGE, {"cursor": cursor if cursor is not None else 0, "limit": limit})
+    roles = result.scalars().all()
+    logger.debug("Страница списка ролей успешно получена: %s ролей", len(roles))
+    next_cursor = roles[-1].id if len(roles) == limit else None
+    return ORJSONResponse({"items": [_role_payload(role) for role in roles], "next_cursor": next_cursor})
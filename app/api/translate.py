@@ -1,8 +1,12 @@
 """
 app/api/translate.py
 """
-import requests
+import asyncio
+import hashlib
 import logging
+
+import httpx
+import orjson
 from fastapi import APIRouter, HTTPException, status, Request, Depends
 from typing import List
 
@@ -10,66 +14,162 @@ from app.core.config import settings
 from app.core.rate_limiter import limiter
 import redis.asyncio as redis
 from app.core.database import get_redis
-
-import json
+from app.core.http import get_http_client, post_with_retries
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/translate")
 
+TRANSLATE_URL = "https://translate.api.cloud.yandex.net/translate/v2/translate"
+_HEADERS = {
+    "Content-Type": "application/json",
+    # Параметры для аутентификации с помощью API-ключа от имени сервисного аккаунта:
+    "Authorization": f"Api-Key {settings.yandex_translate_api_key}",
+}
+CACHE_TTL_SEC = 60 * 60 * 24  # Храним переводы в кэше 24 часа
+CACHE_WRITE_CONCURRENCY = 256  # Ограничение фоновых записей в кэш
+
+_cache_write_semaphore = asyncio.Semaphore(CACHE_WRITE_CONCURRENCY)
+_background_tasks: set[asyncio.Task] = set()  # Ссылки на задачи, чтобы их не удалил сборщик мусора
+skipped_cache_writes = 0  # Счетчик записей, пропущенных из-за переполнения
+# Переводы, которые уже запрошены у API: ключ кэша -> результат. Одинаковые конкурентные запросы ждут первый
+_inflight: dict[str, asyncio.Future] = {}
+
+
+class _TranslationAbandoned(Exception):
+    """Запрос, который переводил строку, отменен до получения ответа - ожидающие переводят ее сами."""
+
+
+def _cache_key(source_language_code: str, target_language_code: str, text: str) -> str:
+    """Ключ кэша перевода одной строки: хэш текста вместо самого текста."""
+    digest = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+    return f"tr:{source_language_code}:{target_language_code}:{digest}"
+
+
+async def _write_cache(redis_client: redis.Redis, items: list[tuple[str, str]]):
+    """Сохраняет переводы в кэш одним конвейером."""
+    async with _cache_write_semaphore:
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key, translated in items:
+                    pipe.set(key, translated, ex=CACHE_TTL_SEC)
+                await pipe.execute()
+            logger.debug("Перевод сохранен в кэше для %s строк", len(items))
+        except redis.RedisError as e:
+            logger.error("Не удалось сохранить перевод в Redis: %s", e)
+
+
+def _schedule_cache_write(redis_client: redis.Redis, items: list[tuple[str, str]]):
+    """Запускает запись в кэш фоном; при переполнении очереди запись пропускается."""
+    global skipped_cache_writes
+    if _cache_write_semaphore.locked():
+        skipped_cache_writes += 1
+        logger.warning("Очередь записи в кэш переполнена, пропущено записей: %s", skipped_cache_writes)
+        return
+    task = asyncio.create_task(_write_cache(redis_client, items))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _request_translations(http_client: httpx.AsyncClient, texts: list[str],
+                                source_language_code: str, target_language_code: str) -> list[str]:
+    """Переводит строки одним запросом к API Яндекс Переводчика."""
+    body = orjson.dumps({
+        "sourceLanguageCode": source_language_code,
+        "targetLanguageCode": target_language_code,
+        "texts": texts,
+        "folderId": settings.yandex_translate_folder_id,
+    })
+    response = await post_with_retries(http_client, TRANSLATE_URL, content=body, headers=_HEADERS)
+
+    response.raise_for_status()
+    translations = orjson.loads(response.content)["translations"]
+    if len(translations) != len(texts):
+        logger.error("API перевода вернуло %s строк вместо %s", len(translations), len(texts))
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY,
+                            detail="Некорректный ответ сервиса перевода")
+    logger.debug("Текст успешно переведен. Исходный язык: %s, целевой язык: %s",
+                 source_language_code, target_language_code)
+    return [item["text"] for item in translations]
+
 
 @router.post("/")
 @limiter.limit("30/minute")
 async def translate(request: Request, text: str | List[str],
                     source_language_code: str = 'ko', target_language_code: str = 'ru',
-                    redis_client: redis.Redis = Depends(get_redis)):
+                    redis_client: redis.Redis = Depends(get_redis),
+                    http_client: httpx.AsyncClient = Depends(get_http_client)):
     try:
         if isinstance(text, str):
             text = [text]
+        if not text:
+            return []
 
-        cache_key = f"translate:{source_language_code}:{target_language_code}:{text}"
+        # Повторяющиеся строки запрашиваются из кэша и переводятся один раз
+        unique_texts = list(dict.fromkeys(text))
+        # Каждая строка кэшируется отдельно: ключ фиксированной длины, повторное использование между запросами
+        cache_keys = [_cache_key(source_language_code, target_language_code, item) for item in unique_texts]
         try:
-            cached_result = await redis_client.get(cache_key)
-        except redis.exceptions.ConnectionError as e:
-            logger.error(f"Не удалось подключиться к Redis: {e}")
+            cached_results = await redis_client.mget(cache_keys)
+        except redis.ConnectionError as e:
+            logger.error("Не удалось подключиться к Redis: %s", e)
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                                 detail="Не удалось подключиться к Redis") from e
-        if cached_result:
-            logger.debug(f"Перевод найден в кэше для ключа: {cache_key}")
-            return json.loads(cached_result)
-
-        body = {
-            "sourceLanguageCode": source_language_code,
-            "targetLanguageCode": target_language_code,
-            "texts": text,
-            "folderId": settings.yandex_translate_folder_id,
-        }
-        headers = {
-            "Content-Type": "application/json",
-            # Параметры для аутентификации с помощью API-ключа от имени сервисного аккаунта:
-            "Authorization": "Api-Key {0}".format(settings.yandex_translate_api_key),
-        }
-        response = requests.post(
-            "https://translate.api.cloud.yandex.net/translate/v2/translate",
-            json=body,
-            headers=headers,
-        )
-
-        response.raise_for_status()
-        data = response.json()
-        translated_texts = [item["text"] for item in data["translations"]]
-        logger.debug(
-            f"Текст успешно переведен. Исходный язык: {source_language_code}, целевой язык: {target_language_code}")
-        try:
-            await redis_client.set(cache_key, json.dumps(translated_texts), ex=60 * 60 * 24)  # Храним в кэше 24 часа
-            logger.debug(f"Перевод сохранен в кэше для ключа: {cache_key}")
-        except redis.exceptions.ConnectionError as e:
-            logger.error(f"Failed to connect to Redis: {e}")
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                                detail="Failed to connect to Redis") from e
-        return translated_texts
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка при обращении к API перевода: {e}")
+        missing = [i for i, cached in enumerate(cached_results) if cached is None]
+        if missing:
+            # Строки, которые уже переводятся другим запросом, не отправляются в API повторно
+            waiting = {i: _inflight[cache_keys[i]] for i in missing if cache_keys[i] in _inflight}
+            owned = [i for i in missing if i not in waiting]
+            loop = asyncio.get_running_loop()
+            futures = {i: loop.create_future() for i in owned}
+            for i, future in futures.items():
+                _inflight[cache_keys[i]] = future
+
+            if owned:
+                try:
+                    translated_texts = await _request_translations(
+                        http_client, [unique_texts[i] for i in owned], source_language_code, target_language_code)
+                    for i, translated in zip(owned, translated_texts):
+                        futures[i].set_result(translated)
+                        cached_results[i] = translated
+                except Exception as e:
+                    for future in futures.values():
+                        if not future.done():
+                            future.set_exception(e)
+                            future.exception()  # Ошибка передана ожидающим, предупреждение asyncio не нужно
+                    raise
+                finally:
+                    for i, future in futures.items():
+                        _inflight.pop(cache_keys[i], None)
+                        if not future.done():
+                            # Этот запрос отменен: ожидающие получают не CancelledError, а сигнал перевести самим
+                            future.set_exception(_TranslationAbandoned())
+                            future.exception()
+                # Запись в кэш не задерживает ответ клиенту
+                _schedule_cache_write(redis_client, [(cache_keys[i], cached_results[i]) for i in owned])
+
+            abandoned = []
+            for i, future in waiting.items():
+                try:
+                    # shield: отмена этого запроса не отменяет перевод, которого ждут другие запросы
+                    cached_results[i] = await asyncio.shield(future)
+                except _TranslationAbandoned:
+                    abandoned.append(i)
+            if abandoned:
+                translated_texts = await _request_translations(
+                    http_client, [unique_texts[i] for i in abandoned], source_language_code, target_language_code)
+                for i, translated in zip(abandoned, translated_texts):
+                    cached_results[i] = translated
+                _schedule_cache_write(redis_client, [(cache_keys[i], cached_results[i]) for i in abandoned])
+        else:
+            logger.debug("Перевод найден в кэше для ключей: %s", cache_keys)
+
+        translations = dict(zip(unique_texts, cached_results))
+        return [translations[item] for item in text]
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        logger.error("Ошибка при обращении к API перевода: %s", e)
         raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Ошибка при обращении к сервису перевода")
-    except Exception as e:
-        logger.exception(f"Ошибка перевода: {e}")
+    except Exception:
+        logger.exception("Ошибка перевода")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Произошла ошибка перевода")
@@ -2,12 +2,12 @@
 app/core/config.py
 Определяет настройки приложения с использованием Pydantic.
 Настройки включают секретные ключи, конфигурацию базы данных и Redis.
-Загружает переменные окружения из файла .env.
+Значения переменных окружения и файла .env имеют приоритет над значениями по умолчанию.
 """
-import os
+from functools import lru_cache
+from typing import Optional
+
 from pydantic_settings import BaseSettings
-from dotenv import load_dotenv
-load_dotenv()
 
 
 class Settings(BaseSettings):
@@ -25,29 +25,45 @@ class Settings(BaseSettings):
         db_host (str): Хост базы данных.
         db_port (int): Порт базы данных.
         redis_url (str): URL для подключения к Redis.
+        redis_max_connections (int): Максимальное число соединений в пуле Redis.
         smtp_server (str): SMTP сервер для отправки электронной почты.
         email_password (str): Пароль к учетной записи электронной почты.
         email_sender (str): Адрес электронной почты отправителя.
         smtp_port (int): Порт SMTP сервера.
+        argon2_time_cost (int): Число проходов argon2id при хэшировании паролей.
+        argon2_memory_cost (int): Объем памяти argon2id в КиБ.
+        argon2_parallelism (int): Число потоков argon2id.
+        password_hash_workers (int | None): Размер пула процессов хэширования (по умолчанию - число ядер).
+        password_max_length (int): Максимальная длина пароля в символах.
+        sql_echo (bool): Логировать SQL-запросы (только для отладки, заметно замедляет работу).
     """
-    secret_key: str = os.getenv("SECRET_KEY", "your_secret_key")
-    algorithm: str = os.getenv("ALGORITHM", "HS256")
-    access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
-    refresh_token_expire_minutes: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_MINUTES", 60 * 24 * 30))  # 30 дней
+    secret_key: str = "your_secret_key"
+    algorithm: str = "HS256"
+    access_token_expire_minutes: int = 30
+    refresh_token_expire_minutes: int = 60 * 24 * 30  # 30 дней
+
+    db_name: str = "postgres"
+    db_user: str = "postgres"
+    db_password: str = "password"
+    db_host: str = "db"
+    db_port: int = 5432
 
-    db_name: str = os.getenv("DB_NAME", "postgres")
-    db_user: str = os.getenv("DB_USER", "postgres")
-    db_password: str = os.getenv("DB_PASSWORD", "password")
-    db_host: str = os.getenv("DB_HOST", "db")
-    db_port: int = int(os.getenv("DB_PORT", 5432))
+    redis_host: str = "redis://localhost"
+    redis_port: int = 6379
+    redis_max_connections: int = 50
 
-    redis_host: str = os.getenv("REDIS_HOST", "redis://localhost")
-    redis_port: int = int(os.getenv("REDIS_PORT", 6379))
+    yandex_translate_api_key: str
+    yandex_translate_folder_id: str
 
-    yandex_translate_api_key: str = os.getenv("YANDEX_TRANSLATE_API_KEY")
-    yandex_translate_folder_id: str = os.getenv("YANDEX_TRANSLATE_FOLDER_ID")
+    # Параметры хэширования паролей подбираются под оборудование, см. app/utils/calibrate_hashing.py
+    argon2_time_cost: int = 1
+    argon2_memory_cost: int = 47104
+    argon2_parallelism: int = 1
+    password_hash_workers: Optional[int] = None
+    password_max_length: int = 128  # Ограничивает время и память на хэширование одного пароля
 
-    debug: bool = os.getenv("DEBUG", "False").lower() == "true"
+    sql_echo: bool = False
+    debug: bool = False
 
     @property
     def database_url(self) -> str:
@@ -64,4 +80,14 @@ class Settings(BaseSettings):
         env_file_encoding = 'utf-8'
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Возвращает единственный экземпляр настроек.
+    Переменные окружения и файл .env разбираются один раз. Модули читают настройки при импорте через settings,
+    поэтому app.dependency_overrides на них не влияет.
+    """
+    return Settings()
+
+
+settings = get_settings()
@@ -5,22 +5,95 @@ app/core/database.py
 """
 import asyncio
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.orm import declarative_base
 from app.core.config import settings
 import redis.asyncio as redis
 import logging
 
 Base = declarative_base()
 DATABASE_URL = settings.database_url
-engine = create_async_engine(DATABASE_URL, echo=True)
-async_session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
-redis_client = redis.Redis.from_url(settings.redis_host, decode_responses=True)
-# decode_responses=True for string keys/values
+POOL_SIZE = 20  # Постоянно открытые соединения
+MAX_OVERFLOW = 40  # Дополнительные соединения при пиковой нагрузке
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=settings.sql_echo,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    connect_args={
+        "prepared_statement_cache_size": 512,  # Кэш подготовленных выражений на стороне SQLAlchemy
+        "statement_cache_size": 1024,  # Кэш подготовленных выражений asyncpg
+    },
+)
+async_session = async_sessionmaker(engine, expire_on_commit=False)
+# Ограниченный пул: при исчерпании запросы ждут свободное соединение, а не открывают новые без предела
+redis_pool = redis.BlockingConnectionPool.from_url(
+    settings.redis_host,
+    max_connections=settings.redis_max_connections,
+    timeout=5,
+    decode_responses=True,  # decode_responses=True for string keys/values
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
 
 logger = logging.getLogger("app")
 
 
+# Изменения схемы для баз, созданных до появления ограничений: create_all не меняет существующие таблицы.
+# Каталог проверяется при каждом запуске, а DDL выполняется, только если чего-то не хватает
+_SCHEMA_UPGRADE_LOCK_ID = 0x4B6F7265  # Ключ advisory-блокировки: одновременно стартующие воркеры ждут друг друга
+_SELECT_INDEX_NAMES = text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")
+_SELECT_REGISTERED_AT_DEFAULT = text(
+    "SELECT column_default FROM information_schema.columns "
+    "WHERE table_schema = current_schema() AND table_name = 'user' AND column_name = 'registered_at'"
+)
+# Для ON CONFLICT (user_id) при сохранении refresh token: сначала оставляем только последний токен пользователя
+_REFRESH_TOKEN_USER_ID_KEY = "refresh_token_user_id_key"
+_DEDUPLICATE_REFRESH_TOKENS = text(
+    "DELETE FROM refresh_token a USING refresh_token b WHERE a.user_id = b.user_id AND a.id < b.id"
+)
+_CREATE_REFRESH_TOKEN_USER_ID_KEY = text(
+    f"CREATE UNIQUE INDEX IF NOT EXISTS {_REFRESH_TOKEN_USER_ID_KEY} ON refresh_token (user_id)"
+)
+# Индекс по expires_at ничего не читало: токен у пользователя один и перезаписывается, таблица не растет
+_REFRESH_TOKEN_EXPIRES_AT_INDEX = "ix_refresh_token_expires_at"
+_DROP_REFRESH_TOKEN_EXPIRES_AT = text(f"DROP INDEX IF EXISTS {_REFRESH_TOKEN_EXPIRES_AT_INDEX}")
+_SET_REGISTERED_AT_DEFAULT = text(
+    """ALTER TABLE "user" ALTER COLUMN registered_at SET DEFAULT timezone('utc', now())"""
+)
+
+
+def _pending_schema_upgrades(conn) -> list:
+    """Возвращает выражения, которых не хватает схеме; для актуальной базы - пустой список."""
+    existing = set(conn.execute(_SELECT_INDEX_NAMES).scalars())
+    statements = []
+    if _REFRESH_TOKEN_USER_ID_KEY not in existing:
+        statements += [_DEDUPLICATE_REFRESH_TOKENS, _CREATE_REFRESH_TOKEN_USER_ID_KEY]
+    if _REFRESH_TOKEN_EXPIRES_AT_INDEX in existing:
+        statements.append(_DROP_REFRESH_TOKEN_EXPIRES_AT)
+    if conn.execute(_SELECT_REGISTERED_AT_DEFAULT).scalar() is None:
+        statements.append(_SET_REGISTERED_AT_DEFAULT)
+    statements += [CreateIndex(index, if_not_exists=True) for table in Base.metadata.sorted_tables
+                   for index in table.indexes if index.name not in existing]
+    return statements
+
+
+def _upgrade_schema(conn):
+    """Досоздает недостающие ограничения и индексы из моделей."""
+    if not _pending_schema_upgrades(conn):
+        return
+    # Под блокировкой список пересчитывается: другой воркер мог уже все применить
+    conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": _SCHEMA_UPGRADE_LOCK_ID})
+    for statement in _pending_schema_upgrades(conn):
+        conn.execute(statement)
+    logger.info("Схема базы данных обновлена.")
+
+
 async def init_db():
     """
     Инициализирует базу данных, создавая все таблицы в базе данных.
@@ -31,10 +104,12 @@ async def init_db():
         try:
             async with engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(_upgrade_schema)
+            await warm_up_pool()
             logger.info("Инициализация базы данных успешно завершена.")
             return
         except Exception as e:
-            logger.error(f"Попытка {attempt + 1} не окончилась успехом к подключении к базе данных: {e}")
+            logger.error("Попытка %s не окончилась успехом к подключении к базе данных: %s", attempt + 1, e)
             if attempt < max_retries - 1:
                 await asyncio.sleep(retry_delay_sec)
             else:
@@ -43,23 +118,29 @@ async def init_db():
                 raise e
 
 
+async def warm_up_pool():
+    """
+    Заранее открывает POOL_SIZE соединений, чтобы первые запросы не тратили время на подключение.
+    """
+    async def _connect():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(_connect() for _ in range(POOL_SIZE)))
+    logger.info("Пул соединений с базой данных прогрет: %s соединений", POOL_SIZE)
+
+
 async def get_db() -> AsyncSession:
     """
     Получает сессию базы данных.
+    FastAPI кэширует зависимость в пределах запроса, поэтому get_current_user и обработчик
+    работают в одной сессии. Изменяющие эндпоинты фиксируют транзакцию сами, а незафиксированная
+    транзакция (например, у читающих запросов) откатывается при закрытии сессии без лишнего COMMIT.
     """
-    session = async_session()
-    logger.info("Создана новая сессия базы данных")
-    try:
+    async with async_session() as session:
+        logger.info("Создана новая сессия базы данных")
         yield session
-        await session.commit()
-        logger.info("Сессия базы данных успешно завершена и закрыта")
-    except Exception as e:
-        await session.rollback()
-        logger.exception(f"Произошла ошибка, откат сессии: {e}")
-        raise
-    finally:
-        await session.close()
-        logger.info("Сессия базы данных закрыта")
+    logger.info("Сессия базы данных закрыта")
 
 
 async def get_redis() -> redis.Redis:
@@ -67,3 +148,10 @@ async def get_redis() -> redis.Redis:
     Получает клиента Redis.
     """
     return redis_client
+
+
+async def close_redis():
+    """
+    Закрывает соединения пула Redis при остановке приложения.
+    """
+    await redis_pool.disconnect()
@@ -0,0 +1,48 @@
+"""
+app/core/http.py
+Общий асинхронный HTTP-клиент для обращений к внешним сервисам.
+Один клиент на процесс переиспользует keep-alive соединения и мультиплексирует запросы по HTTP/2.
+Имя хоста разрешается только при открытии соединения, поэтому долгоживущие соединения избавляют и от DNS-запросов.
+"""
+import asyncio
+
+import httpx
+
+CONNECT_RETRIES = 3  # Повторы при ошибках установки соединения
+RETRY_STATUSES = frozenset({502, 503, 504})
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF_SEC = 0.1
+
+# При явно заданном транспорте лимиты и HTTP/2 настраиваются на нем, а не на клиенте
+http_client = httpx.AsyncClient(
+    timeout=10,
+    transport=httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=CONNECT_RETRIES,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60),
+    ),
+)
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    """
+    Получает HTTP-клиента.
+    """
+    return http_client
+
+
+async def post_with_retries(client: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+    """
+    Отправляет POST-запрос, повторяя его с экспоненциальной задержкой при временных ошибках сервера.
+    """
+    for attempt in range(RETRY_ATTEMPTS):
+        response = await client.post(url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == RETRY_ATTEMPTS - 1:
+            return response
+        await asyncio.sleep(RETRY_BACKOFF_SEC * 2 ** attempt)
+    return response
+
+
+async def close_http_client():
+    """Закрывает соединения HTTP-клиента."""
+    await http_client.aclose()
@@ -0,0 +1,145 @@
+"""
+app/core/security.py
+Хэширование и проверка паролей.
+Хэши вычисляются напрямую через argon2-cffi и bcrypt в пуле процессов, чтобы не блокировать цикл событий.
+"""
+import asyncio
+import hashlib
+import os
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from argon2 import PasswordHasher, Type
+from argon2.exceptions import InvalidHashError, VerificationError
+
+from app.core.config import settings
+
+# Параметры хэширования подобраны под интерактивный вход (< 500 мс), см. app/utils/calibrate_hashing.py,
+# и задаются в настройках. По умолчанию argon2id по рекомендациям OWASP (46 МиБ, t=1, p=1); bcrypt оставлен
+# для проверки старых хэшей, которые перехэшируются в argon2 при следующем успешном входе.
+ARGON2_TIME_COST = settings.argon2_time_cost
+ARGON2_MEMORY_COST = settings.argon2_memory_cost
+ARGON2_PARALLELISM = settings.argon2_parallelism
+
+password_hasher = PasswordHasher(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST,
+                                 parallelism=ARGON2_PARALLELISM, type=Type.ID)
+_BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+_BCRYPT_MAX_BYTES = 72  # bcrypt учитывает только первые 72 байта пароля
+PASSWORD_MAX_LENGTH = settings.password_max_length  # Проверяется в схемах при установке пароля
+# Граница для проверки при входе: во много раз больше старых паролей, созданных до ограничения длины,
+# и лишь защищает пул хэширования от строк произвольной длины
+PASSWORD_VERIFY_MAX_LENGTH = 4096
+
+# Процессы запускаются при первом обращении или заранее в warm_up_hash_pool
+HASH_POOL_SIZE = settings.password_hash_workers or os.cpu_count()
+HASH_POOL = ProcessPoolExecutor(max_workers=HASH_POOL_SIZE)
+
+# Кэш неудачных проверок: повторный перебор той же пары пароль/хэш не тратит время на хэширование.
+# Успешные проверки не кэшируются, чтобы в памяти не оставалось быстрого хэша верного пароля.
+FAILED_VERIFY_CACHE_MAX_SIZE = 10_000
+FAILED_VERIFY_CACHE_TTL_SEC = 30
+_failed_verify_cache: OrderedDict = OrderedDict()  # ключ -> время истечения по time.monotonic()
+
+
+def _hash(password: str) -> str:
+    return password_hasher.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    if hashed_password.startswith(_BCRYPT_PREFIXES):
+        if bcrypt.checkpw(password.encode()[:_BCRYPT_MAX_BYTES], hashed_password.encode()):
+            return True, password_hasher.hash(password)
+        return False, None
+
+    try:
+        password_hasher.verify(hashed_password, password)
+    except (VerificationError, InvalidHashError):
+        return False, None
+    if password_hasher.check_needs_rehash(hashed_password):
+        return True, password_hasher.hash(password)
+    return True, None
+
+
+async def hash_password(password: str) -> str:
+    """Возвращает хэш пароля, вычисленный в пуле процессов."""
+    return await asyncio.get_running_loop().run_in_executor(HASH_POOL, _hash, password)
+
+
+def _failed_verify_key(username: str, password: str, hashed_password: str) -> bytes:
+    # Имя пользователя входит в ключ, чтобы записи разных учетных записей не совпадали;
+    # хэш из базы - чтобы после смены пароля старые записи не совпали
+    return hashlib.sha256(b"\0".join((username.encode(), hashed_password.encode(), password.encode()))).digest()
+
+
+def _is_known_failure(key: bytes) -> bool:
+    expires = _failed_verify_cache.get(key)
+    if expires is None:
+        return False
+    if expires <= time.monotonic():
+        del _failed_verify_cache[key]
+        return False
+    return True
+
+
+def _remember_failure(key: bytes):
+    _failed_verify_cache[key] = time.monotonic() + FAILED_VERIFY_CACHE_TTL_SEC
+    _failed_verify_cache.move_to_end(key)
+    while len(_failed_verify_cache) > FAILED_VERIFY_CACHE_MAX_SIZE:
+        _failed_verify_cache.popitem(last=False)
+
+
+async def verify_and_update_password(password: str, hashed_password: str,
+                                     username: str | None = None) -> tuple[bool, str | None]:
+    """
+    Проверяет пароль в пуле процессов.
+    Возвращает (совпадает ли пароль, новый хэш или None, если перехэширование не требуется).
+    Неудачные проверки кэшируются только для существующего пользователя, когда передано username.
+    """
+    if len(password) > PASSWORD_VERIFY_MAX_LENGTH:
+        # Отказ без хэширования произвольно длинной строки
+        return False, None
+    key = _failed_verify_key(username, password, hashed_password) if username is not None else None
+    if key is not None and _is_known_failure(key):
+        return False, None
+    verified, new_hash = await asyncio.get_running_loop().run_in_executor(HASH_POOL, _verify_and_update, password,
+                                                                          hashed_password)
+    if not verified and key is not None:
+        _remember_failure(key)
+    return verified, new_hash
+
+
+_dummy_hash: str | None = None  # Хэш случайного пароля для входа несуществующего пользователя
+
+
+async def verify_dummy_password(password: str):
+    """
+    Проверяет пароль против хэша случайного пароля.
+    Вызывается, когда пользователь не найден, чтобы время ответа не выдавало существование пользователя.
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await hash_password(secrets.token_urlsafe(16))
+    # Кэш неудачных проверок не используется: каждый вход несуществующего пользователя вычисляет argon2 полностью
+    await asyncio.get_running_loop().run_in_executor(HASH_POOL, _verify_and_update, password, _dummy_hash)
+
+
+async def warm_up_hash_pool():
+    """
+    Запускает все процессы пула и вычисляет хэш для несуществующих пользователей до первого запроса,
+    чтобы первые входы и регистрации не ждали старта процессов и импорта библиотек хэширования.
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await hash_password(secrets.token_urlsafe(16))
+    loop = asyncio.get_running_loop()
+    # Одновременные задачи по числу процессов заставляют пул поднять их все
+    await asyncio.gather(*(loop.run_in_executor(HASH_POOL, _verify_and_update, "", _dummy_hash)
+                           for _ in range(HASH_POOL_SIZE)))
+
+
+def shutdown_hash_pool():
+    """Останавливает пул процессов хэширования."""
+    HASH_POOL.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,77 @@
+"""
+app/core/tokens.py
+Подпись и проверка JWT.
+Алгоритм, подготовленный ключ и заголовок вычисляются один раз при импорте; для HS* на каждый токен
+копируется состояние HMAC с уже обработанным ключом вместо повторной настройки ключа.
+"""
+import binascii
+import hmac
+import time
+
+import jwt
+import orjson
+from jwt.utils import base64url_decode, base64url_encode
+
+from app.core.config import settings
+
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+
+_JWT_ALGORITHM = jwt.algorithms.get_default_algorithms()[ALGORITHM]
+_JWT_KEY = _JWT_ALGORITHM.prepare_key(SECRET_KEY)
+_JWT_HEADER_SEGMENT = base64url_encode(orjson.dumps({"alg": ALGORITHM, "typ": "JWT"}, option=orjson.OPT_SORT_KEYS))
+_JWT_HMAC = (hmac.new(_JWT_KEY, digestmod=_JWT_ALGORITHM.hash_alg)
+             if isinstance(_JWT_ALGORITHM, jwt.algorithms.HMACAlgorithm) else None)
+
+
+def _sign(signing_input: bytes) -> bytes:
+    if _JWT_HMAC is None:
+        return _JWT_ALGORITHM.sign(signing_input, _JWT_KEY)
+    mac = _JWT_HMAC.copy()
+    mac.update(signing_input)
+    return mac.digest()
+
+
+def encode_token(payload: dict) -> str:
+    """
+    Возвращает подписанный JWT с заданной полезной нагрузкой.
+    Заголовок совпадает с заголовком PyJWT, но полезная нагрузка сериализуется orjson: не-ASCII символы пишутся
+    в UTF-8, а не как \\uXXXX. Поэтому токен может отличаться от jwt.encode побайтно, хотя обе стороны его принимают.
+    """
+    signing_input = _JWT_HEADER_SEGMENT + b"." + base64url_encode(orjson.dumps(payload))
+    return (signing_input + b"." + base64url_encode(_sign(signing_input))).decode()
+
+
+def decode_token(token: str) -> dict:
+    """
+    Проверяет подпись и срок действия JWT и возвращает полезную нагрузку.
+    Токены с заголовком, который выпускает это приложение, проверяются напрямую; остальные - через PyJWT.
+    Ошибки - исключения PyJWT (jwt.ExpiredSignatureError, jwt.InvalidTokenError).
+    """
+    encoded = token.encode()
+    signing_input, _, signature_segment = encoded.rpartition(b".")
+    header_segment, _, payload_segment = signing_input.partition(b".")
+    if _JWT_HMAC is None or header_segment != _JWT_HEADER_SEGMENT:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+    try:
+        signature = base64url_decode(signature_segment)
+    except (binascii.Error, ValueError) as e:
+        raise jwt.DecodeError("Неверная подпись токена") from e
+    if not hmac.compare_digest(_sign(signing_input), signature):
+        raise jwt.InvalidSignatureError("Подпись токена не совпадает")
+
+    try:
+        payload = orjson.loads(base64url_decode(payload_segment))
+    except (binascii.Error, ValueError) as e:
+        raise jwt.DecodeError("Неверная полезная нагрузка токена") from e
+    if not isinstance(payload, dict):
+        raise jwt.DecodeError("Полезная нагрузка токена должна быть объектом")
+
+    exp = payload.get("exp")
+    if exp is not None:
+        if not isinstance(exp, int):
+            raise jwt.DecodeError("Поле exp должно быть целым числом")
+        if exp <= time.time():
+            raise jwt.ExpiredSignatureError("Срок действия токена истек")
+    return payload
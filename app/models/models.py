@@ -2,11 +2,10 @@
 app/models/models.py
 Определяет модели пользователя и пользовательских ролей.
 """
-from datetime import datetime
 from typing import Optional
 
 from sqlalchemy import (TIMESTAMP, Boolean, Column, ForeignKey, Integer,
-                        String, ARRAY)
+                        String, ARRAY, Index, func)
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
@@ -14,12 +13,18 @@ from app.core.database import Base
 class User(Base):
     """Класс для определения таблицы пользователей"""
     __tablename__ = "user"
+    __table_args__ = (
+        # Уникальный покрывающий индекс для входа: id и хэш пароля читаются из индекса без обращения к таблице.
+        # Он же обеспечивает уникальность имени, отдельный unique-индекс на username не нужен
+        Index("ix_user_username_credentials", "username", unique=True, postgresql_include=["id", "hashed_password"]),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
-    username = Column(String, nullable=False, unique=True)
+    username = Column(String, nullable=False)
     hashed_password = Column(String(length=1024), nullable=False)
     email = Column(String, nullable=False, unique=True)
-    role_id: int = Column(Integer, ForeignKey('role.id'), nullable=False, default=1)
-    registered_at = Column(TIMESTAMP, default=datetime.utcnow)
+    role_id: int = Column(Integer, ForeignKey('role.id'), nullable=False, default=1, index=True)
+    # Время регистрации (UTC) проставляет база данных и возвращает через RETURNING при вставке
+    registered_at = Column(TIMESTAMP, server_default=func.timezone("utc", func.now()))
     is_active: bool = Column(Boolean, default=True, nullable=False)
     is_superuser: bool = Column(Boolean, default=False, nullable=False)
     is_verified: bool = Column(Boolean, default=False, nullable=False)
@@ -49,8 +54,12 @@ class Role(Base):
 
 class RefreshToken(Base):
     __tablename__ = "refresh_token"
+    __table_args__ = (
+        # Уникальный покрывающий индекс для проверки токена без обращения к таблице, заменяет unique на token
+        Index("ix_refresh_token_token_expires", "token", unique=True, postgresql_include=["expires_at", "user_id"]),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
-    token = Column(String(length=255), nullable=False, unique=True)
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False, unique=True)  # Одна сессия на пользователя
+    token = Column(String(length=255), nullable=False)
     expires_at = Column(TIMESTAMP, nullable=False)
     user = relationship("User", back_populates="refresh_tokens")
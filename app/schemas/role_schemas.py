@@ -3,27 +3,30 @@ app/schemas/role_schemas.py
 Определяет схемы данных ролей пользователей.
 """
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 
 
 class RoleCreate(BaseModel):
-    pass
     name: str
     permissions: List[str] = []
 
 
 class RoleUpdate(BaseModel):
-    pass
     name: Optional[str] = None
     permissions: Optional[List[str]] = None
 
 
 class RoleResponse(BaseModel):
-    pass
     id: int
     name: str
     permissions: List[str]
 
-    class Config:
-        from_attributes = True
+    # Модель только для ответов: без лишних возможностей валидатора, схема строится при первом использовании
+    model_config = ConfigDict(from_attributes=True, extra="ignore", frozen=True, defer_build=True)
+
+
+class RolePage(BaseModel):
+    """Страница списка ролей; next_cursor передается в следующий запрос, None - ролей больше нет."""
+    items: List[RoleResponse]
+    next_cursor: Optional[int] = None
@@ -7,6 +7,8 @@ from typing import Optional
 
 from pydantic import EmailStr, BaseModel, ConfigDict, Field
 
+from app.core.config import settings
+
 
 class UserBase(BaseModel):
     """Базовая модель для пользователя, содержащая общие поля."""
@@ -18,14 +20,14 @@ class UserBase(BaseModel):
 
 class UserCreate(UserBase):
     """Модель для создания пользователя на основе класса UserBase."""
-    password: str
+    password: str = Field(max_length=settings.password_max_length)
 
     model_config = ConfigDict(from_attributes=True)
 
 
 class UserUpdate(UserBase):
     """Модель для обновления информации о пользователе на основе класса UserBase."""
-    password: str
+    password: str = Field(max_length=settings.password_max_length)
     additional_info: Optional[str] = None
     role_id: int
 
@@ -41,4 +43,16 @@ class UserResponse(UserBase):
     is_superuser: bool = False
     is_verified: bool = False
 
-    model_config = ConfigDict(from_attributes=True)
+    # Модель только для ответов: без лишних возможностей валидатора, схема строится при первом использовании
+    model_config = ConfigDict(from_attributes=True, extra="ignore", frozen=True, defer_build=True)
+
+
+_USER_RESPONSE_FIELDS = tuple(UserResponse.model_fields)
+
+
+def user_response_payload(user) -> dict:
+    """
+    Поля UserResponse, взятые напрямую из пользователя базы данных.
+    Данные уже проверены при записи, поэтому повторная валидация (в том числе EmailStr) не выполняется.
+    """
+    return {field: getattr(user, field) for field in _USER_RESPONSE_FIELDS}
@@ -0,0 +1,144 @@
+"""
+app/services/role_service.py
+Получение разрешений роли с кэшированием в памяти процесса и в Redis.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+import orjson
+import redis.asyncio as redis
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import redis_client
+from app.models.models import Role
+
+logger = logging.getLogger(__name__)
+
+ROLE_PERMISSIONS_TTL_SEC = 60
+LOCAL_CACHE_MAX_SIZE = 1024
+LOCAL_CACHE_TTL_SEC = 30  # Страховка на случай потерянного сообщения об инвалидации
+PERMISSIONS_INVALIDATE_CHANNEL = "perms:invalidate"
+
+# Локальный кэш процесса: role_id -> (время истечения по time.monotonic(), frozenset разрешений)
+_local_permissions: OrderedDict = OrderedDict()
+_invalidation_listener: asyncio.Task | None = None
+_SELECT_ROLE_PERMISSIONS = select(Role.permissions).where(Role.id == bindparam("role_id"))
+
+
+def _role_permissions_key(role_id: int) -> str:
+    return f"role:perms:{role_id}"
+
+
+def _get_local(role_id: int) -> frozenset[str] | None:
+    entry = _local_permissions.get(role_id)
+    if entry is None:
+        return None
+    if entry[0] <= time.monotonic():
+        del _local_permissions[role_id]
+        return None
+    _local_permissions.move_to_end(role_id)
+    return entry[1]
+
+
+def _store_local(role_id: int, permissions: frozenset[str]):
+    _local_permissions[role_id] = (time.monotonic() + LOCAL_CACHE_TTL_SEC, permissions)
+    _local_permissions.move_to_end(role_id)
+    while len(_local_permissions) > LOCAL_CACHE_MAX_SIZE:
+        _local_permissions.popitem(last=False)
+
+
+def _evict_local(role_id: int):
+    _local_permissions.pop(role_id, None)
+
+
+async def get_role_permissions(db: AsyncSession, role_id: int) -> frozenset[str] | None:
+    """
+    Возвращает множество разрешений роли или None, если роль не найдена.
+    Сначала ищет в памяти процесса, затем в Redis, при промахе читает из базы данных и сохраняет в кэш.
+    """
+    permissions = _get_local(role_id)
+    if permissions is not None:
+        return permissions
+
+    key = _role_permissions_key(role_id)
+    try:
+        cached = await redis_client.get(key)
+        if cached is not None:
+            permissions = frozenset(orjson.loads(cached))
+            _store_local(role_id, permissions)
+            return permissions
+    except redis.RedisError as e:
+        logger.error("Не удалось прочитать разрешения роли из Redis: %s", e)
+
+    result = await db.execute(_SELECT_ROLE_PERMISSIONS, {"role_id": role_id})
+    row = result.first()
+    if row is None:
+        return None
+    permissions_list = row[0] or []
+    permissions = frozenset(permissions_list)
+    _store_local(role_id, permissions)
+
+    try:
+        await redis_client.set(key, orjson.dumps(permissions_list), ex=ROLE_PERMISSIONS_TTL_SEC)
+    except redis.RedisError as e:
+        logger.error("Не удалось сохранить разрешения роли в Redis: %s", e)
+    return permissions
+
+
+async def warm_up_role_statements(db: AsyncSession):
+    """Выполняет запрос разрешений роли без обращения к кэшу, чтобы он был скомпилирован заранее."""
+    await db.execute(_SELECT_ROLE_PERMISSIONS, {"role_id": 0})
+
+
+async def invalidate_role_permissions(role_id: int):
+    """
+    Удаляет разрешения роли из кэша после ее изменения.
+    Остальные процессы получают сообщение через Redis pub/sub и очищают свои локальные кэши.
+    """
+    _evict_local(role_id)
+    try:
+        await redis_client.delete(_role_permissions_key(role_id))
+        await redis_client.publish(PERMISSIONS_INVALIDATE_CHANNEL, role_id)
+    except redis.RedisError as e:
+        logger.error("Не удалось удалить разрешения роли из Redis: %s", e)
+
+
+async def _listen_invalidations():
+    """Слушает канал инвалидации и удаляет роли из локального кэша; переподключается при ошибках."""
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(PERMISSIONS_INVALIDATE_CHANNEL)
+                # После переподключения сообщения могли быть пропущены
+                _local_permissions.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        _evict_local(int(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Ошибка подписки на инвалидацию разрешений: %s", e)
+            _local_permissions.clear()
+            await asyncio.sleep(1)
+
+
+def start_permissions_invalidation_listener():
+    """Запускает фоновую задачу подписки на инвалидацию разрешений."""
+    global _invalidation_listener
+    if _invalidation_listener is None or _invalidation_listener.done():
+        _invalidation_listener = asyncio.create_task(_listen_invalidations())
+
+
+async def stop_permissions_invalidation_listener():
+    """Останавливает фоновую задачу подписки на инвалидацию разрешений."""
+    global _invalidation_listener
+    if _invalidation_listener is not None:
+        _invalidation_listener.cancel()
+        try:
+            await _invalidation_listener
+        except asyncio.CancelledError:
+            pass
+        _invalidation_listener = None
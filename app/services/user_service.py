@@ -1,18 +1,41 @@
 """
 app/services/user_services.py
 """
+from functools import lru_cache
+
+from sqlalchemy import bindparam, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
+
+
+@lru_cache(maxsize=None)
+def _select_user_by_username():
+    """Собирает запрос пользователя по имени один раз и переиспользует его."""
+    # Не удалять импорт, возможна ошибка: ImportError: cannot import name 'User' from partially initialized module
+    # 'models' (most likely due to a circular import)
+    from app.models.models import User
+    return select(User).where(User.username == bindparam("username"))
+
+
+@lru_cache(maxsize=None)
+def _select_user_credentials():
+    """Собирает запрос только тех полей пользователя, которые нужны для входа."""
+    from app.models.models import User
+    return select(User.id, User.username, User.hashed_password).where(User.username == bindparam("username"))
 
 
 async def get_user(db: AsyncSession, username: str):
     """
     Получает пользователя по имени пользователя из базы данных.
-
     """
-    # Не удалять импорт, возможна ошибка: ImportError: cannot import name 'User' from partially initialized module
-    # 'models' (most likely due to a circular import)
-    from app.models.models import User
-    result = await db.execute(select(User).where(User.username == username))
+    result = await db.execute(_select_user_by_username(), {"username": username})
     user = result.scalars().first()
     return user
+
+
+async def get_user_credentials(db: AsyncSession, username: str):
+    """
+    Возвращает строку (id, username, hashed_password) для проверки пароля или None.
+    ORM-объект пользователя и его роль не загружаются.
+    """
+    result = await db.execute(_select_user_credentials(), {"username": username})
+    return result.first()
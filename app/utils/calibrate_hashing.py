@@ -0,0 +1,55 @@
+"""
+app/utils/calibrate_hashing.py
+Подбирает параметры хэширования паролей под текущее железо.
+Запуск: python -m app.utils.calibrate_hashing
+"""
+import statistics
+import time
+
+import bcrypt
+from argon2 import PasswordHasher, Type
+
+from app.core.security import ARGON2_MEMORY_COST
+
+TARGET_P95_MS = 400
+SAMPLES = 20
+
+
+def measure_p95(hash_func, samples: int = SAMPLES) -> float:
+    """Возвращает 95-й перцентиль времени хэширования в миллисекундах."""
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        hash_func("x")
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.quantiles(timings, n=20)[-1]
+
+
+def calibrate_bcrypt_rounds(target_ms: float = TARGET_P95_MS) -> int:
+    """Подбирает максимальное число раундов bcrypt, укладывающееся в target_ms."""
+    best = 4
+    for rounds in range(4, 16):
+        p95 = measure_p95(lambda password: bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=rounds)))
+        print(f"bcrypt rounds={rounds}: p95={p95:.1f} мс")
+        if p95 > target_ms:
+            break
+        best = rounds
+    return best
+
+
+def calibrate_argon2_time_cost(memory_cost: int = ARGON2_MEMORY_COST, target_ms: float = TARGET_P95_MS) -> int:
+    """Подбирает максимальный time_cost argon2id при фиксированной памяти, укладывающийся в target_ms."""
+    best = 1
+    for time_cost in range(1, 11):
+        hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=1, type=Type.ID)
+        p95 = measure_p95(hasher.hash)
+        print(f"argon2id t={time_cost}, m={memory_cost} КиБ: p95={p95:.1f} мс")
+        if p95 > target_ms:
+            break
+        best = time_cost
+    return best
+
+
+if __name__ == "__main__":
+    print(f"Рекомендуемые параметры: ARGON2_TIME_COST={calibrate_argon2_time_cost()}, "
+          f"bcrypt rounds={calibrate_bcrypt_rounds()}")
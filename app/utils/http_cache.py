@@ -0,0 +1,26 @@
+"""
+app/utils/http_cache.py
+HTTP-кэширование ответов с помощью ETag и Cache-Control.
+"""
+import hashlib
+
+from fastapi import Request, Response, status
+
+CACHE_CONTROL = "private, max-age=30"
+
+
+def make_etag(body: bytes) -> str:
+    """Вычисляет ETag по содержимому ответа."""
+    return f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+def etag_json_response(request: Request, body: bytes) -> Response:
+    """
+    Возвращает JSON-ответ с ETag, либо пустой 304, если клиент прислал совпадающий If-None-Match.
+    """
+    etag = make_etag(body)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -2,38 +2,52 @@
 app/utils/permissions.py
 """
 import logging
+from functools import lru_cache
 
 from fastapi import Depends, HTTPException, Request, status
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.dependencies import get_current_user
-from app.core.config import settings
 from app.core.database import get_db
-from app.models.models import User as UserModel, Role
+from app.models.models import User as UserModel
+from app.services.role_service import get_role_permissions
 
 logger = logging.getLogger(__name__)
-SECRET_KEY = settings.secret_key
-ALGORITHM = settings.algorithm
-ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
 
-def permission_dependency(permission: str):
-    async def check_permission_dependency(request: Request, current_user: UserModel = Depends(get_current_user),
-                                          db: AsyncSession = Depends(get_db)):
-        # Получаем роль пользователя по его role_id
-        role = await db.scalar(select(Role).where(Role.id == current_user.role_id))
+async def get_user_permissions(current_user: UserModel = Depends(get_current_user),
+                               db: AsyncSession = Depends(get_db)) -> frozenset[str]:
+    """
+    Возвращает разрешения роли текущего пользователя.
+    Как зависимость FastAPI вычисляется один раз за запрос и общая для всех проверок разрешений.
+    """
+    # Единственный источник разрешений: кэш процесса и Redis с инвалидацией между воркерами, база - при промахе.
+    # Роль из кэша токенов не используется, иначе после изменения роли другие воркеры видели бы старые разрешения
+    permissions = await get_role_permissions(db, current_user.role_id)
+
+    if permissions is None:
+        logger.warning("Ошибка проверки разрешений: Роль не найдена для пользователя %s", current_user.username)
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Роль не найдена")
+    return permissions
 
-        if not role:
-            logger.warning(f"Ошибка проверки разрешений: Роль не найдена для пользователя {current_user.username}")
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Роль не найдена")
-        logger.warning(f"Ошибка проверки разрешений: Роль не найдена для пользователя {current_user.username}")
 
-        if permission not in role.permissions:
-            logger.warning(f"Ошибка проверки разрешений: У пользователя {current_user.username} нет прав {permission}")
+@lru_cache(maxsize=None)
+def permission_dependency(*required: str):
+    """
+    Возвращает зависимость, проверяющую, что у пользователя есть все указанные разрешения.
+    Для одного набора разрешений возвращается один и тот же объект, поэтому FastAPI выполняет проверку
+    один раз за запрос, даже если зависимость указана в нескольких местах.
+    """
+    required_set = frozenset(required)
+
+    async def check_permission_dependency(request: Request, current_user: UserModel = Depends(get_current_user),
+                                          permissions: frozenset[str] = Depends(get_user_permissions)):
+        if not required_set <= permissions:
+            logger.warning("Ошибка проверки разрешений: У пользователя %s нет прав %s",
+                           current_user.username, ", ".join(sorted(required_set - permissions)))
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
-        logger.debug(f"Проверка разрешений успешно пройдена для пользователя {current_user.username},"
-                     f"требуется разрешение: {permission}")
+        logger.debug("Проверка разрешений успешно пройдена для пользователя %s, требуются разрешения: %s",
+                     current_user.username, ", ".join(required))
         return True
 
     return check_permission_dependency
@@ -6,32 +6,39 @@ import logging
 from fastapi import FastAPI, WebSocket, Depends, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import HTMLResponse, JSONResponse
+from starlette.responses import HTMLResponse
 
 from app.core.config import settings
 from app.models.models import User as UserModel
-from app.core.database import init_db, get_db
+from app.core.database import async_session, close_redis, init_db, get_db
 from app.api.auth import router as auth_router
 from app.api.translate import router as translate_router
 from app.core.logger import configure_logging
 from app.api.roles import router as role_router
 from app.core.rate_limiter import limiter, init_rate_limiter
+from app.core.http import close_http_client
+from app.core.security import shutdown_hash_pool, warm_up_hash_pool
+from app.services.role_service import (start_permissions_invalidation_listener, stop_permissions_invalidation_listener,
+                                       warm_up_role_statements)
+from app.services.user_service import get_user, get_user_credentials
 
 
 class LoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request, call_next):
-        logger.info(f"Request: {request.method} {request.url}")
+        logger.info("Request: %s %s", request.method, request.url)
         response = await call_next(request)
-        logger.info(f"Response status: {response.status_code}")
+        logger.info("Response status: %s", response.status_code)
         return response
 
 
 configure_logging()
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 init_rate_limiter(app)
 
@@ -50,15 +57,45 @@ app.include_router(role_router)
 
 logger = logging.getLogger("app")
 
+_DB_STATUS_QUERY = select(UserModel.id).limit(1)
+
+
+async def warm_up_statements():
+    """
+    Выполняет горячие запросы с заведомо пустым результатом, чтобы SQLAlchemy скомпилировал их
+    и закэшировал до первого пользовательского запроса.
+    """
+    async with async_session() as session:
+        await get_user(session, "")
+        await get_user_credentials(session, "")
+        await warm_up_role_statements(session)
+    logger.info("Горячие SQL-запросы скомпилированы.")
+
 
 @app.on_event("startup")
 async def startup_event():
     """Функция, выполняемая при запуске приложения fastapi"""
     try:
         await init_db()
+        start_permissions_invalidation_listener()
+        await warm_up_statements()
+        await warm_up_hash_pool()
+        logger.info("Пул процессов хэширования паролей запущен.")
         logger.info("Приложение запущено, инициализация базы данных завершена.")
     except Exception as e:
-        logger.critical(f"Ошибка при запуске приложения: {e}")
+        logger.critical("Ошибка при запуске приложения: %s", e)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Функция, выполняемая при остановке приложения fastapi"""
+    await stop_permissions_invalidation_listener()
+    shutdown_hash_pool()
+    logger.info("Пул процессов хэширования паролей остановлен.")
+    await close_http_client()
+    logger.info("HTTP-клиент закрыт.")
+    await close_redis()
+    logger.info("Соединения с Redis закрыты.")
 
 
 @app.get("/db-status")
@@ -67,12 +104,12 @@ async def check_db_connection(request: Request, db: AsyncSession = Depends(get_d
     """Функция-проверка соединения с базой данных"""
     try:
         logger.info("Попытка выполнения запроса к базе данных...")
-        await db.execute(select(UserModel).limit(1))
+        await db.execute(_DB_STATUS_QUERY)
         logger.info("Соединение с базой данных успешно проверено.")
-        logger.info(f"Значение settings.db_host: {settings.db_host}")
+        logger.info("Значение settings.db_host: %s", settings.db_host)
         return HTMLResponse(status_code=200, content="Соединение с базой данных успешно")
     except Exception as e:
-        logger.error(f"Ошибка соединения с базой данных: {e}")
+        logger.error("Ошибка соединения с базой данных: %s", e)
         return HTMLResponse(status_code=500, content=f"Соединение с базой данных разорвано. Произошла ошибка {e}")
     finally:
         logger.info("Завершение работы эндпоинта /db-status")
@@ -86,9 +123,9 @@ async def websocket_endpoint(websocket: WebSocket):
         while True:
             data = await websocket.receive_text()
             await websocket.send_text(f"Текст сообщения: {data}")
-            logger.debug(f"Получено сообщение по WebSocket: {data}")
-    except Exception as e:
-        logger.exception(f"Ошибка вебсокета: {e}")
+            logger.debug("Получено сообщение по WebSocket: %s", data)
+    except Exception:
+        logger.exception("Ошибка вебсокета")
     finally:
         await websocket.close()
 
@@ -96,18 +133,35 @@ async def websocket_endpoint(websocket: WebSocket):
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Обработчик ошибок валидации запроса (например, неверный тип данных)."""
-    logger.warning(f"Ошибка валидации запроса: {exc.errors()}")
-    return JSONResponse(
+    logger.warning("Ошибка валидации запроса: %s", exc.errors())
+    return ORJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={"detail": exc.errors()},
     )
 
 
+@app.exception_handler(SQLAlchemyError)
+async def database_exception_handler(request: Request, exc: SQLAlchemyError):
+    """Обработчик ошибок базы данных, не перехваченных в эндпоинтах."""
+    logger.exception("Ошибка базы данных при обработке %s %s", request.method, request.url.path)
+    return ORJSONResponse(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        content={"detail": "Ошибка базы данных."},
+    )
+
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Общий обработчик исключений.  Логирует ошибку и возвращает стандартный ответ."""
-    logger.exception(f"Произошла необработанная ошибка: {exc}")
-    return JSONResponse(
+    logger.exception("Произошла необработанная ошибка")
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": "Произошла внутренняя ошибка сервера."},
     )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # uvloop и httptools входят в uvicorn[standard]
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
@@ -2,7 +2,7 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.ext.asyncio import AsyncSession
 from main import app
-from database import init_db, get_db
+from app.core.database import init_db, get_db
 
 
 @pytest.fixture(scope="module")
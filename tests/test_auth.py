@@ -9,3 +9,24 @@ async def test_register_user(test_app, db_session):
     })
     assert response.status_code == 200
     assert response.json()["username"] == "testuser"
+
+
+def test_create_access_token_is_valid_jwt():
+    import jwt
+    from app.api.auth import create_access_token
+    from app.core.config import settings
+
+    token = create_access_token({"sub": "testuser"})
+    claims = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    assert claims["sub"] == "testuser"
+    assert isinstance(claims["exp"], int)
+
+
+@pytest.mark.asyncio
+async def test_refresh_without_cookie_is_bad_request():
+    from fastapi import HTTPException, Response
+    from app.api.auth import refresh_token_endpoint
+
+    with pytest.raises(HTTPException) as exc_info:
+        await refresh_token_endpoint.__wrapped__(None, refresh_token=None, db=None, response=Response())
+    assert exc_info.value.status_code == 400
@@ -4,3 +4,58 @@ import pytest
 async def test_db_connection(test_app, db_session):
     response = await db_session.execute("SELECT 1")
     assert response.scalar() == 1
+
+
+class FakeCatalogConnection:
+    """Синхронное соединение для _upgrade_schema: отвечает на запросы к каталогу, остальное записывает."""
+
+    def __init__(self, index_names, registered_at_default="timezone('utc'::text, now())"):
+        self.index_names = index_names
+        self.registered_at_default = registered_at_default
+        self.executed = []
+
+    def execute(self, statement, params=None):
+        from types import SimpleNamespace
+
+        from app.core import database
+
+        if statement is database._SELECT_INDEX_NAMES:
+            return SimpleNamespace(scalars=lambda: list(self.index_names))
+        if statement is database._SELECT_REGISTERED_AT_DEFAULT:
+            return SimpleNamespace(scalar=lambda: self.registered_at_default)
+        self.executed.append(statement)
+        if statement is database._CREATE_REFRESH_TOKEN_USER_ID_KEY:
+            self.index_names.add(database._REFRESH_TOKEN_USER_ID_KEY)
+
+
+def _model_index_names():
+    import app.models.models  # noqa: F401 - регистрирует таблицы в метаданных
+    from app.core.database import Base
+
+    return {index.name for table in Base.metadata.sorted_tables for index in table.indexes}
+
+
+def test_schema_upgrade_is_skipped_for_current_database():
+    from app.core import database
+
+    conn = FakeCatalogConnection(_model_index_names() | {database._REFRESH_TOKEN_USER_ID_KEY})
+    database._upgrade_schema(conn)
+    assert conn.executed == []
+
+
+def test_schema_upgrade_adds_refresh_token_user_id_key_under_lock():
+    from app.core import database
+
+    conn = FakeCatalogConnection(_model_index_names())
+    database._upgrade_schema(conn)
+    assert "pg_advisory_xact_lock" in str(conn.executed[0])
+    assert conn.executed[1:] == [database._DEDUPLICATE_REFRESH_TOKENS, database._CREATE_REFRESH_TOKEN_USER_ID_KEY]
+
+
+def test_schema_upgrade_drops_unused_expires_at_index():
+    from app.core import database
+
+    conn = FakeCatalogConnection(_model_index_names() | {database._REFRESH_TOKEN_USER_ID_KEY,
+                                                         database._REFRESH_TOKEN_EXPIRES_AT_INDEX})
+    database._upgrade_schema(conn)
+    assert conn.executed[1:] == [database._DROP_REFRESH_TOKEN_EXPIRES_AT]
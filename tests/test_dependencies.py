@@ -0,0 +1,76 @@
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+from app.api import dependencies
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    dependencies.TOKEN_CACHE.clear()
+    yield
+    dependencies.TOKEN_CACHE.clear()
+
+
+@pytest.mark.asyncio
+async def test_token_cache_hit_and_expiry():
+    user = SimpleNamespace(id=1)
+    await dependencies._store_cached_user("fresh", time.time() + 60, user)
+    await dependencies._store_cached_user("expired", time.time() - 1, user)
+
+    assert await dependencies._get_cached_user("fresh") is user
+    assert await dependencies._get_cached_user("expired") is None
+    assert "expired" not in dependencies.TOKEN_CACHE
+
+
+@pytest.mark.asyncio
+async def test_token_cache_entry_lifetime_is_capped():
+    await dependencies._store_cached_user("long", time.time() + 3600, SimpleNamespace(id=1))
+    assert dependencies.TOKEN_CACHE["long"][0] <= time.time() + dependencies.TOKEN_CACHE_TTL_SEC
+
+
+@pytest.mark.asyncio
+async def test_token_cache_credits_force_reverification():
+    user = SimpleNamespace(id=1)
+    await dependencies._store_cached_user("token", time.time() + 60, user)
+    for _ in range(dependencies.TOKEN_CACHE_CREDITS):
+        assert await dependencies._get_cached_user("token") is user
+    assert await dependencies._get_cached_user("token") is None
+
+
+@pytest.mark.asyncio
+async def test_invalidate_user_tokens():
+    await dependencies._store_cached_user("a", time.time() + 60, SimpleNamespace(id=1))
+    await dependencies._store_cached_user("b", time.time() + 60, SimpleNamespace(id=2))
+    await dependencies.invalidate_user_tokens(1)
+    assert list(dependencies.TOKEN_CACHE) == ["b"]
+
+
+@pytest.mark.asyncio
+async def test_user_json_is_cached_with_token():
+    user = SimpleNamespace(id=1, username="testuser", email="testuser@example.com", role_id=1,
+                           registered_at=datetime(2024, 1, 1), is_active=True, is_superuser=False,
+                           is_verified=False)
+    await dependencies._store_cached_user("token", time.time() + 60, user)
+    body = await dependencies.get_cached_user_json("token", user)
+    assert orjson.loads(body)["username"] == "testuser"
+
+    user.username = "renamed"
+    assert await dependencies.get_cached_user_json("token", user) is body
+
+
+def test_cached_user_is_detached_snapshot():
+    from sqlalchemy import inspect
+
+    from app.models.models import User
+
+    user = User(id=1, username="testuser", email="testuser@example.com", role_id=1)
+    snapshot = dependencies._detached_snapshot(user)
+    user.username = "renamed"
+
+    assert snapshot is not user
+    assert snapshot.username == "testuser"
+    assert inspect(snapshot).detached
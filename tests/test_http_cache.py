@@ -0,0 +1,23 @@
+from starlette.requests import Request
+
+from app.utils.http_cache import etag_json_response, make_etag
+
+
+def make_request(headers: dict) -> Request:
+    raw_headers = [(key.lower().encode(), value.encode()) for key, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/me", "headers": raw_headers})
+
+
+def test_response_carries_etag():
+    body = b'{"id":1}'
+    response = etag_json_response(make_request({}), body)
+    assert response.status_code == 200
+    assert response.body == body
+    assert response.headers["etag"] == make_etag(body)
+
+
+def test_matching_if_none_match_returns_304():
+    body = b'{"id":1}'
+    response = etag_json_response(make_request({"If-None-Match": f'"other", W/{make_etag(body)}'}), body)
+    assert response.status_code == 304
+    assert response.body == b""
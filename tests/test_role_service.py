@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+from app.services import role_service
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.published = []
+        self.gets = 0
+
+    async def get(self, key):
+        self.gets += 1
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+    async def delete(self, key):
+        self.store.pop(key, None)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(role_service, "redis_client", fake)
+    role_service._local_permissions.clear()
+    yield fake
+    role_service._local_permissions.clear()
+
+
+@pytest.mark.asyncio
+async def test_local_cache_skips_redis(fake_redis):
+    fake_redis.store[role_service._role_permissions_key(1)] = orjson.dumps(["manage_users"])
+    db = SimpleNamespace()
+
+    assert await role_service.get_role_permissions(db, 1) == frozenset({"manage_users"})
+    assert await role_service.get_role_permissions(db, 1) == frozenset({"manage_users"})
+    assert fake_redis.gets == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_evicts_local_cache_and_notifies_workers(fake_redis):
+    role_service._store_local(1, frozenset({"manage_users"}))
+    await role_service.invalidate_role_permissions(1)
+
+    assert 1 not in role_service._local_permissions
+    assert fake_redis.published == [(role_service.PERMISSIONS_INVALIDATE_CHANNEL, 1)]
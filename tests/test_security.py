@@ -0,0 +1,140 @@
+import bcrypt
+import pytest
+
+from app.core.security import hash_password, verify_and_update_password
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_password():
+    hashed = await hash_password("testpassword")
+    assert hashed.startswith("$argon2id$")
+    assert await verify_and_update_password("testpassword", hashed) == (True, None)
+    assert (await verify_and_update_password("wrongpassword", hashed))[0] is False
+
+
+@pytest.mark.asyncio
+async def test_legacy_bcrypt_hash_is_upgraded():
+    legacy = bcrypt.hashpw(b"testpassword", bcrypt.gensalt(rounds=4)).decode()
+    verified, new_hash = await verify_and_update_password("testpassword", legacy)
+    assert verified is True
+    assert new_hash.startswith("$argon2id$")
+
+
+@pytest.mark.asyncio
+async def test_argon2_hash_with_outdated_parameters_is_upgraded():
+    from argon2 import PasswordHasher
+
+    outdated = PasswordHasher(time_cost=2, memory_cost=8192, parallelism=1).hash("testpassword")
+    verified, new_hash = await verify_and_update_password("testpassword", outdated)
+    assert verified is True
+    assert new_hash is not None and new_hash != outdated
+
+
+@pytest.mark.asyncio
+async def test_failed_verification_is_cached(monkeypatch):
+    from app.core import security
+
+    hashed = await hash_password("testpassword")
+    assert (await verify_and_update_password("wrongpassword", hashed, "testuser"))[0] is False
+
+    def fail(*args):
+        raise AssertionError("Повторная неудачная проверка не должна вычислять хэш")
+
+    monkeypatch.setattr(security, "_verify_and_update", fail)
+    assert await verify_and_update_password("wrongpassword", hashed, "testuser") == (False, None)
+
+
+@pytest.mark.asyncio
+async def test_failed_verification_cache_is_per_username(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.core import security
+
+    hashed = await hash_password("testpassword")
+    calls = []
+
+    def counting_verify(*args):
+        calls.append(args)
+        return False, None
+
+    # Пул потоков вместо пула процессов, чтобы подмененная функция выполнялась в этом процессе
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        monkeypatch.setattr(security, "HASH_POOL", pool)
+        monkeypatch.setattr(security, "_verify_and_update", counting_verify)
+        await verify_and_update_password("wrongpassword", hashed, "ghost")
+        await verify_and_update_password("wrongpassword", hashed, "other-ghost")
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_dummy_password_verification_uses_argon2():
+    from app.core import security
+
+    await security.verify_dummy_password("testpassword")
+    assert security._dummy_hash.startswith("$argon2id$")
+
+
+@pytest.mark.asyncio
+async def test_repeated_dummy_login_costs_the_same_as_cold_one(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.core import security
+
+    await security.verify_dummy_password("warmup")
+    security._failed_verify_cache.clear()
+    real_verify = security._verify_and_update
+    calls = []
+
+    def counting_verify(*args):
+        calls.append(args)
+        return real_verify(*args)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        monkeypatch.setattr(security, "HASH_POOL", pool)
+        monkeypatch.setattr(security, "_verify_and_update", counting_verify)
+        await security.verify_dummy_password("wrongpassword")  # Первый вход
+        await security.verify_dummy_password("wrongpassword")  # Повтор с тем же паролем
+    assert len(calls) == 2
+    assert not security._failed_verify_cache
+
+
+@pytest.mark.asyncio
+async def test_warm_up_hash_pool_prepares_dummy_hash(monkeypatch):
+    from app.core import security
+
+    monkeypatch.setattr(security, "_dummy_hash", None)
+    await security.warm_up_hash_pool()
+    assert security._dummy_hash.startswith("$argon2id$")
+
+
+@pytest.mark.asyncio
+async def test_overlong_password_is_rejected_without_hashing(monkeypatch):
+    from app.core import security
+
+    hashed = await hash_password("testpassword")
+
+    def fail(*args):
+        raise AssertionError("Слишком длинный пароль не должен хэшироваться")
+
+    monkeypatch.setattr(security, "_verify_and_update", fail)
+    password = "x" * (security.PASSWORD_VERIFY_MAX_LENGTH + 1)
+    assert await verify_and_update_password(password, hashed) == (False, None)
+
+
+@pytest.mark.asyncio
+async def test_legacy_password_longer_than_cap_still_verifies():
+    from app.core import security
+
+    password = "x" * (security.PASSWORD_MAX_LENGTH + 1)  # Сохранен до появления ограничения длины
+    hashed = await hash_password(password)
+    assert (await verify_and_update_password(password, hashed))[0] is True
+
+
+def test_user_create_rejects_overlong_password():
+    from pydantic import ValidationError
+
+    from app.core.security import PASSWORD_MAX_LENGTH
+    from app.schemas.user_schemas import UserCreate
+
+    with pytest.raises(ValidationError):
+        UserCreate(username="testuser", email="testuser@example.com", password="x" * (PASSWORD_MAX_LENGTH + 1))
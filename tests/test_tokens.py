@@ -0,0 +1,46 @@
+import time
+
+import jwt
+import pytest
+
+from app.core import tokens
+from app.core.config import settings
+
+
+def test_encoded_token_is_accepted_by_pyjwt_and_decoded_back():
+    token = tokens.encode_token({"sub": "testuser", "exp": int(time.time()) + 60})
+    assert jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])["sub"] == "testuser"
+    assert tokens.decode_token(token)["sub"] == "testuser"
+
+
+def test_tampered_token_is_rejected():
+    token = tokens.encode_token({"sub": "testuser", "exp": int(time.time()) + 60})
+    forged = tokens.encode_token({"sub": "admin", "exp": int(time.time()) + 60})
+    header, _, signature = token.split(".")
+    forged_payload = forged.split(".")[1]
+    with pytest.raises(jwt.InvalidTokenError):
+        tokens.decode_token(f"{header}.{forged_payload}.{signature}")
+
+
+def test_expired_token_is_rejected():
+    token = tokens.encode_token({"sub": "testuser", "exp": int(time.time()) - 1})
+    with pytest.raises(jwt.ExpiredSignatureError):
+        tokens.decode_token(token)
+
+
+def test_token_with_other_header_falls_back_to_pyjwt():
+    token = jwt.encode({"sub": "testuser", "exp": int(time.time()) + 60}, settings.secret_key,
+                       algorithm=settings.algorithm, headers={"kid": "1"})
+    assert tokens.decode_token(token)["sub"] == "testuser"
+    with pytest.raises(jwt.InvalidTokenError):
+        tokens.decode_token(jwt.encode({"sub": "testuser"}, "other-key", algorithm=settings.algorithm))
+
+
+def test_non_ascii_claims_round_trip_with_pyjwt():
+    claims = {"sub": "Алексей", "exp": int(time.time()) + 60}
+    token = tokens.encode_token(claims)
+    assert jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm]) == claims
+    # PyJWT экранирует не-ASCII как \uXXXX, такой токен тоже проходит быструю проверку
+    pyjwt_token = jwt.encode(claims, settings.secret_key, algorithm=settings.algorithm)
+    assert pyjwt_token.split(".")[0] == token.split(".")[0]
+    assert tokens.decode_token(pyjwt_token) == claims
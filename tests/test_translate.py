@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import translate as translate_module
+
+translate = translate_module.translate.__wrapped__  # Без ограничителя частоты запросов
+
+
+class FakeRedis:
+    async def mget(self, keys):
+        return [None] * len(keys)
+
+
+class FakeResponse:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_cache_writes(monkeypatch):
+    monkeypatch.setattr(translate_module, "_schedule_cache_write", lambda *args: None)
+
+
+@pytest.mark.asyncio
+async def test_waiter_translates_itself_when_owner_is_cancelled(monkeypatch):
+    calls = []
+    started = asyncio.Event()
+
+    async def fake_request_translations(http_client, texts, source, target):
+        calls.append(texts)
+        if len(calls) == 1:
+            started.set()
+            await asyncio.sleep(10)
+        return [f"перевод {item}" for item in texts]
+
+    monkeypatch.setattr(translate_module, "_request_translations", fake_request_translations)
+    owner = asyncio.create_task(translate(None, "안녕", redis_client=FakeRedis(), http_client=None))
+    await started.wait()
+    waiter = asyncio.create_task(translate(None, "안녕", redis_client=FakeRedis(), http_client=None))
+    await asyncio.sleep(0)
+    owner.cancel()
+
+    assert await waiter == ["перевод 안녕"]
+    assert len(calls) == 2
+    assert not translate_module._inflight
+
+
+@pytest.mark.asyncio
+async def test_short_translation_reply_is_bad_gateway(monkeypatch):
+    async def fake_post(*args, **kwargs):
+        return FakeResponse(b'{"translations": [{"text": "one"}]}')
+
+    monkeypatch.setattr(translate_module, "post_with_retries", fake_post)
+    with pytest.raises(HTTPException) as exc_info:
+        await translate(None, ["a", "b"], redis_client=FakeRedis(), http_client=None)
+    assert exc_info.value.status_code == 502